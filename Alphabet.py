@@ -0,0 +1,204 @@
+from bisect import bisect_right
+
+from Regex import *
+
+# highest code point a character can have
+MAX_CODE_POINT = 0x10FFFF
+
+
+class AlphabetPartition:
+    # partition of all the characters into equivalence classes: two
+    # characters are in the same class if every character set used by the
+    # regexes either contains both of them or none of them, so they can
+    # share a single column in the transition tables. Automata built over a
+    # partition use the class ids (0 .. class_count - 1) as their symbols.
+    #
+    # the code points are split into intervals at every range boundary;
+    # bounds holds the first code point of each interval, in order, and
+    # interval_classes the class of each interval
+    def __init__(self):
+        self.bounds = [0]
+        self.interval_classes = [0]
+        self.class_count = 1
+
+        # class of every character below 256 and of every character in a
+        # short interval, so that the common characters are classified with
+        # a single dictionary lookup
+        self.char_classes = None
+
+        # class of every byte value, for lexing bytes input; a byte stands
+        # for the character with the same code point (latin-1)
+        self.byte_classes = None
+
+    @staticmethod
+    def build_from_char_sets(char_sets):
+        # char_sets is a list of character sets, each one given as a list of
+        # (first, last) code point ranges
+        bound_set = {0}
+
+        for char_set in char_sets:
+            for (first, last) in char_set:
+                bound_set.add(first)
+
+                if last < MAX_CODE_POINT:
+                    bound_set.add(last + 1)
+
+        bounds = sorted(bound_set)
+
+        # signature of each interval: bit i is set if the interval belongs
+        # to character set i
+        signatures = [0] * len(bounds)
+
+        for (set_idx, char_set) in enumerate(char_sets):
+            for (first, last) in char_set:
+                interval = bisect_right(bounds, first) - 1
+
+                while interval < len(bounds) and bounds[interval] <= last:
+                    signatures[interval] |= 1 << set_idx
+                    interval += 1
+
+        return AlphabetPartition.build_from_signatures(bounds, signatures)
+
+    @staticmethod
+    def build_from_signatures(bounds, signatures):
+        # intervals with the same signature form a class; the classes are
+        # numbered in the order of their first interval
+        partition = AlphabetPartition()
+        partition.bounds = bounds
+        partition.interval_classes = []
+
+        class_ids = dict()
+
+        for signature in signatures:
+            if signature not in class_ids:
+                class_ids[signature] = len(class_ids)
+
+            partition.interval_classes.append(class_ids[signature])
+
+        partition.class_count = len(class_ids)
+        partition.build_char_classes()
+
+        return partition
+
+    @staticmethod
+    def build_from_intervals(bounds, interval_classes):
+        # rebuild a partition from its bounds and interval classes, as
+        # stored by CompiledDfa.to_binary
+        partition = AlphabetPartition()
+        partition.bounds = list(bounds)
+        partition.interval_classes = list(interval_classes)
+        partition.class_count = max(partition.interval_classes) + 1
+        partition.build_char_classes()
+
+        return partition
+
+    @staticmethod
+    def build_from_regex_list(regex_list):
+        # build the partition of the character sets used by the regexes
+        char_sets = []
+        stack = list(regex_list)
+
+        while stack:
+            regex = stack.pop()
+
+            if isinstance(regex, Var):
+                code_point = ord(regex.get_symbol())
+                char_sets.append([(code_point, code_point)])
+            elif isinstance(regex, CharClass):
+                char_sets.append(regex.get_ranges())
+            elif isinstance(regex, Star) or isinstance(regex, Plus):
+                stack.append(regex.get_regex())
+            elif isinstance(regex, Concat) or isinstance(regex, Union):
+                stack.append(regex.get_left_regex())
+                stack.append(regex.get_right_regex())
+
+        return AlphabetPartition.build_from_char_sets(char_sets)
+
+    @staticmethod
+    def build_from_chars(chars):
+        # partition in which each of the given characters is a class
+        return AlphabetPartition.build_from_char_sets(
+            list(map(lambda x: [(ord(x), ord(x))], set(chars))))
+
+    @staticmethod
+    def build_joint(partitions):
+        # build the coarsest partition refining all the given ones; returns
+        # the partition and, for each given partition, a list mapping each
+        # joint class to the class it belongs to in that partition
+        bounds = sorted(set().union(*map(lambda x: set(x.bounds), partitions)))
+        signatures = list(map(lambda x: tuple(map(lambda y: y.classify_code_point(x),
+                                                  partitions)),
+                              bounds))
+
+        joint = AlphabetPartition.build_from_signatures(bounds, signatures)
+
+        class_maps = list(map(lambda x: [0] * joint.class_count, partitions))
+
+        for (joint_class, signature) in zip(joint.interval_classes, signatures):
+            for (class_map, symbol_class) in zip(class_maps, signature):
+                class_map[joint_class] = symbol_class
+
+        return joint, class_maps
+
+    def build_char_classes(self):
+        self.char_classes = dict()
+
+        self.byte_classes = dict()
+
+        for code_point in range(256):
+            self.char_classes[chr(code_point)] = self.classify_code_point(code_point)
+            self.byte_classes[code_point] = self.char_classes[chr(code_point)]
+
+        for (interval, first) in enumerate(self.bounds):
+            last = self.get_interval_last(interval)
+
+            if last - first < 64:
+                for code_point in range(first, last + 1):
+                    self.char_classes[chr(code_point)] = self.interval_classes[interval]
+
+    def get_interval_last(self, interval):
+        if interval + 1 < len(self.bounds):
+            return self.bounds[interval + 1] - 1
+
+        return MAX_CODE_POINT
+
+    def classify_code_point(self, code_point):
+        return self.interval_classes[bisect_right(self.bounds, code_point) - 1]
+
+    def classify(self, char):
+        symbol_class = self.char_classes.get(char)
+
+        if symbol_class is None:
+            symbol_class = self.classify_code_point(ord(char))
+
+        return symbol_class
+
+    def get_classes(self, ranges):
+        # return the sorted list of classes covered by the given code point
+        # ranges; by construction a class is either entirely inside a
+        # character set of the partition or entirely outside of it
+        classes = set()
+
+        for (first, last) in ranges:
+            interval = bisect_right(self.bounds, first) - 1
+
+            while interval < len(self.bounds) and self.bounds[interval] <= last:
+                classes.add(self.interval_classes[interval])
+                interval += 1
+
+        return sorted(classes)
+
+    def get_class_ranges(self, symbol_class):
+        # return the (first, last) code point ranges making up a class
+        return [(first, self.get_interval_last(interval))
+                for (interval, first) in enumerate(self.bounds)
+                if self.interval_classes[interval] == symbol_class]
+
+    def get_class_chars(self, symbol_class):
+        # return every character of a class, in order
+        chars = []
+
+        for (first, last) in self.get_class_ranges(symbol_class):
+            chars += map(lambda x: chr(x), range(first, last + 1))
+
+        return chars
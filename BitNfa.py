@@ -0,0 +1,190 @@
+class BitNfa:
+    # list of Thompson NFAs (see Nfa.build_from_regex) simulated side by
+    # side, without building any DFA state. The active states of every NFA
+    # are kept in a single int bitmask, each NFA having its own range of
+    # bits, and stepping on a class only takes precomputed masks:
+    # symbol_masks[class] selects the states with a transition on it, and
+    # since a state of a Thompson NFA has all its symbol transitions to the
+    # same state, the eps-closure of where each selected state leads is
+    # read from follow_masks. A closure is stored shifted down to its
+    # lowest bit, by follow_shifts, so that it takes the size of the range
+    # of states it spans rather than of the whole state set, and a step
+    # costs one lookup per active state with a transition on the class.
+    def __init__(self):
+        self.partition = None
+        self.class_count = 0
+        self.state_count = 0
+        self.init_set = 0
+
+        self.symbol_masks = None
+        self.follow_masks = None
+        self.follow_shifts = None
+
+        # per NFA: the bits of its states, the bit of its final state, the
+        # position of its rule in the specification and the id of its token
+        # in token_names
+        self.rule_masks = None
+        self.final_masks = None
+        self.rule_ids = None
+        self.rule_tokens = None
+
+        # the tokens of the specification without duplicates, and the id of
+        # the token of each of its rules
+        self.token_names = None
+        self.token_ids = None
+
+    @staticmethod
+    def build_from_nfa_list(nfa_list, tokens, rule_ids=None):
+        # tokens are the tokens of the rules of a specification and
+        # nfa_list[i] is the NFA of the rule at position rule_ids[i], by
+        # default the rules themselves; earlier rules win ties. The NFAs
+        # are built over the same partition of the characters
+        bit_nfa = BitNfa()
+        bit_nfa.partition = nfa_list[0].partition
+        bit_nfa.class_count = bit_nfa.partition.class_count
+
+        bit_nfa.token_names = []
+
+        for token in tokens:
+            if token not in bit_nfa.token_names:
+                bit_nfa.token_names.append(token)
+
+        bit_nfa.token_ids = list(map(lambda x: bit_nfa.token_names.index(x), tokens))
+        bit_nfa.rule_ids = list(range(len(nfa_list))) if rule_ids is None else list(rule_ids)
+        bit_nfa.rule_tokens = list(map(lambda x: bit_nfa.token_ids[x], bit_nfa.rule_ids))
+
+        bit_nfa.symbol_masks = [0] * bit_nfa.class_count
+        bit_nfa.rule_masks = []
+        bit_nfa.final_masks = []
+
+        bit_nfa.follow_masks = []
+        bit_nfa.follow_shifts = []
+        offset = 0
+
+        for nfa in nfa_list:
+            (state_bits, masks) = nfa.get_eps_closure_masks()
+
+            # eps-closure of the state the symbol transitions of each bit
+            # lead to, and where it starts
+            follow_masks = [0] * len(masks)
+            follow_shifts = [0] * len(masks)
+
+            for (from_state, symbol, to_state) in zip(nfa.delta.from_state_list,
+                                                      nfa.delta.symbol_list,
+                                                      nfa.delta.to_state_list):
+                if symbol == "eps":
+                    continue
+
+                bit = state_bits[from_state.components[0]]
+                mask = masks[state_bits[to_state.components[0]]]
+                shift = (mask & -mask).bit_length() - 1
+
+                bit_nfa.symbol_masks[symbol] |= 1 << (offset + bit)
+                follow_masks[bit] = mask >> shift
+                follow_shifts[bit] = offset + shift
+
+            bit_nfa.init_set |= masks[state_bits[nfa.get_init_state().components[0]]] << offset
+            bit_nfa.rule_masks.append(((1 << len(masks)) - 1) << offset)
+            bit_nfa.final_masks.append(
+                1 << (offset + state_bits[nfa.get_final_states()[-1].components[0]]))
+
+            bit_nfa.follow_masks.extend(follow_masks)
+            bit_nfa.follow_shifts.extend(follow_shifts)
+
+            offset += len(masks)
+
+        bit_nfa.state_count = offset
+
+        return bit_nfa
+
+    def get_memory_size(self):
+        # rough number of bytes taken by the masks, which is all the size of
+        # a BitNfa that grows with the NFAs
+        masks = self.symbol_masks + self.follow_masks + self.rule_masks + self.final_masks
+
+        return 8 * (2 * self.state_count + len(masks)) \
+            + sum(map(lambda x: (x.bit_length() + 7) // 8, masks))
+
+    def step(self, state_set, symbol_class):
+        follow_masks = self.follow_masks
+        follow_shifts = self.follow_shifts
+
+        from_set = state_set & self.symbol_masks[symbol_class]
+        to_set = 0
+
+        while from_set:
+            low_bit = from_set & -from_set
+            bit = low_bit.bit_length() - 1
+
+            to_set |= follow_masks[bit] << follow_shifts[bit]
+            from_set ^= low_bit
+
+        return to_set
+
+    def get_live_rules(self, state_set):
+        # number of NFAs with an active state
+        return len(list(filter(lambda x: state_set & x, self.rule_masks)))
+
+    def get_accept_rule(self, state_set):
+        # index of the first NFA in its final state, or -1
+        for (rule, final_mask) in enumerate(self.final_masks):
+            if state_set & final_mask:
+                return rule
+
+        return -1
+
+    def scan(self, word, start_pos, char_classes):
+        # run the NFAs on word from start_pos until they all rejected or the
+        # word ended; return the end of the longest match and the index of
+        # the NFA recognising it (-1, -1 if there is none), the last
+        # position where an NFA rejected or -1, and whether an NFA was
+        # still alive at the end. char_classes is the one of the partition
+        # matching the type of word, as in Lexer.run_tokens
+        classify = self.partition.classify
+        symbol_masks = self.symbol_masks
+        follow_masks = self.follow_masks
+        follow_shifts = self.follow_shifts
+        rule_masks = self.rule_masks
+        final_masks = self.final_masks
+        word_len = len(word)
+
+        state_set = self.init_set
+        live = list(filter(lambda x: state_set & rule_masks[x], range(len(rule_masks))))
+        max_pos = -1
+        max_rule = -1
+        rejection = -1
+        pos = start_pos
+
+        while live and pos < word_len:
+            symbol_class = char_classes.get(word[pos])
+
+            if symbol_class is None:
+                symbol_class = classify(word[pos])
+
+            from_set = state_set & symbol_masks[symbol_class]
+            state_set = 0
+
+            while from_set:
+                low_bit = from_set & -from_set
+                bit = low_bit.bit_length() - 1
+
+                state_set |= follow_masks[bit] << follow_shifts[bit]
+                from_set ^= low_bit
+
+            next_live = [rule for rule in live if state_set & rule_masks[rule]]
+
+            if len(next_live) < len(live):
+                # some NFA rejected on this character
+                rejection = pos
+
+            live = next_live
+
+            for rule in live:
+                if state_set & final_masks[rule]:
+                    max_pos = pos
+                    max_rule = rule
+                    break
+
+            pos += 1
+
+        return max_pos, max_rule, rejection, len(live) > 0
@@ -0,0 +1,276 @@
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+from Alphabet import AlphabetPartition
+
+# binary format of a compiled DFA (see CompiledDfa.to_binary): a header,
+# the token names, the partition of the characters, the per-state tables
+# and the transition table, all integers being little-endian
+BINARY_MAGIC = b"LEXDFA\0\0"
+BINARY_VERSION = 1
+
+# magic, version, state_count, class_count, init_state, sink_state,
+# number of tokens, size of the token names, number of intervals
+BINARY_HEADER = struct.Struct("<8s8I")
+
+
+class CompiledDfa:
+    # runtime form of a DFA used by the Lexer: states are ints, the
+    # transitions are a flat table indexed by state * class_count + class
+    # and the per-state information is kept in flat arrays, so stepping on
+    # a character never touches State or Delta objects
+    def __init__(self):
+        # every transition is in the table, unlike in a LazyDfa
+        self.lazy = False
+
+        self.state_count = 0
+        self.class_count = 0
+        self.init_state = 0
+        self.sink_state = 0
+
+        # partition of the characters into classes, the class of a
+        # character is its column in the table (see AlphabetPartition)
+        self.partition = None
+
+        # flat transition table
+        self.table = None
+
+        # per state: id of the recognised token (index in token_names) or
+        # -1 for non-final states, and the number of rules still alive
+        self.accept_tokens = None
+        self.live_rules = None
+
+        # per state flags, 1 for accepting and dead states respectively
+        self.accepting = None
+        self.dead = None
+
+        self.token_names = None
+
+    @staticmethod
+    def build_from_dfa(dfa):
+        # dfa is either a combined DFA (see Dfa.build_combined) or a plain
+        # DFA recognising a single token
+        compiled = CompiledDfa()
+
+        # give every state an id, keeping the ones the DFA already uses
+        state_ids = dict()
+
+        for (state_id, state) in enumerate(dfa.state_set):
+            state_ids[state] = state_id
+
+        compiled.state_count = len(dfa.state_set)
+        compiled.init_state = state_ids[dfa.get_init_state()]
+
+        # the sink state is the first dead state; a DFA without one gets an
+        # extra state with no way out
+        if dfa.sink_states:
+            compiled.sink_state = state_ids[dfa.sink_states[0]]
+        else:
+            compiled.sink_state = compiled.state_count
+            compiled.state_count += 1
+
+        compiled.partition = dfa.partition
+        compiled.class_count = dfa.partition.class_count
+
+        # every transition that isn't in the DFA leads to the sink state
+        compiled.table = array("i", [compiled.sink_state]) \
+            * (compiled.state_count * compiled.class_count)
+
+        for (from_state, symbol, to_state) in zip(dfa.delta.from_state_list,
+                                                  dfa.delta.symbol_list,
+                                                  dfa.delta.to_state_list):
+            if from_state in state_ids:
+                compiled.table[state_ids[from_state] * compiled.class_count + symbol] = \
+                    state_ids[to_state]
+
+        if dfa.state_tokens is not None:
+            compiled.token_names = []
+
+            for token in dfa.rule_tokens:
+                if token not in compiled.token_names:
+                    compiled.token_names.append(token)
+        else:
+            compiled.token_names = [dfa.get_token()]
+
+        compiled.accept_tokens = array("i", [-1]) * compiled.state_count
+        compiled.live_rules = array("i", [0]) * compiled.state_count
+        compiled.accepting = bytearray(compiled.state_count)
+        compiled.dead = bytearray(compiled.state_count)
+
+        for state in dfa.state_set:
+            state_id = state_ids[state]
+
+            if dfa.is_sink_state(state):
+                compiled.dead[state_id] = 1
+                continue
+
+            if dfa.state_tokens is not None:
+                compiled.live_rules[state_id] = dfa.get_live_rules(state)
+            else:
+                compiled.live_rules[state_id] = 1
+
+            if dfa.is_final_state(state):
+                compiled.accepting[state_id] = 1
+                compiled.accept_tokens[state_id] = \
+                    compiled.token_names.index(dfa.get_token(state))
+
+        compiled.dead[compiled.sink_state] = 1
+
+        # the sink state only leads back to itself
+        for symbol_class in range(compiled.class_count):
+            compiled.table[compiled.sink_state * compiled.class_count + symbol_class] = \
+                compiled.sink_state
+
+        return compiled
+
+    @staticmethod
+    def build_empty(partition, token_names=None):
+        # DFA recognising nothing, its only state being the dead sink state
+        compiled = CompiledDfa()
+        compiled.state_count = 1
+        compiled.partition = partition
+        compiled.class_count = partition.class_count
+        compiled.table = array("i", [0]) * compiled.class_count
+        compiled.accept_tokens = array("i", [-1])
+        compiled.live_rules = array("i", [0])
+        compiled.accepting = bytearray(1)
+        compiled.dead = bytearray([1])
+        compiled.token_names = [] if token_names is None else token_names
+
+        return compiled
+
+    @staticmethod
+    def build_from_binary(data):
+        # data is a bytes-like object holding a compiled DFA in the binary
+        # format, usually a mapped file (see build_from_file); the tables
+        # are views of data, nothing is built per state. Return None if
+        # data doesn't hold a compiled DFA in this version of the format.
+        view = memoryview(data)
+
+        if len(view) < BINARY_HEADER.size:
+            return None
+
+        (magic, version, state_count, class_count, init_state, sink_state,
+         token_count, names_size, interval_count) = BINARY_HEADER.unpack_from(view)
+
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            return None
+
+        # the names are padded so that the integer sections stay aligned
+        names_end = BINARY_HEADER.size + names_size + (-names_size % 4)
+        size = names_end + 4 * (2 * interval_count + 2 * state_count
+                                + state_count * class_count) + 2 * state_count
+
+        if len(view) < size:
+            return None
+
+        offset = names_end
+
+        def take(format, count):
+            nonlocal offset
+
+            section = view[offset:offset + count * struct.calcsize(format)].cast(format)
+            offset += len(section) * section.itemsize
+
+            if sys.byteorder == "big" and format != "B":
+                # only a little-endian machine can use the data directly
+                section = array(format, section)
+                section.byteswap()
+
+            return section
+
+        compiled = CompiledDfa()
+        compiled.state_count = state_count
+        compiled.class_count = class_count
+        compiled.init_state = init_state
+        compiled.sink_state = sink_state
+
+        names = str(view[BINARY_HEADER.size:BINARY_HEADER.size + names_size], "utf-8")
+        compiled.token_names = names.split("\0")[:token_count]
+
+        bounds = take("I", interval_count)
+        interval_classes = take("i", interval_count)
+        compiled.partition = AlphabetPartition.build_from_intervals(bounds, interval_classes)
+
+        compiled.accept_tokens = take("i", state_count)
+        compiled.live_rules = take("i", state_count)
+        compiled.table = take("i", state_count * class_count)
+        compiled.accepting = take("B", state_count)
+        compiled.dead = take("B", state_count)
+
+        return compiled
+
+    @staticmethod
+    def build_from_file(filepath):
+        # load a compiled DFA written by write_binary with a single mapping
+        # of the file; raise a ValueError telling why if the file doesn't
+        # hold one in the format this version reads
+        with open(filepath, "rb") as fd:
+            if os.fstat(fd.fileno()).st_size < BINARY_HEADER.size:
+                raise ValueError("{}: too short to hold a compiled DFA".format(filepath))
+
+            # the mapping outlives the file and lasts as long as the tables
+            data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version) = BINARY_HEADER.unpack_from(data)[:2]
+
+        if magic != BINARY_MAGIC:
+            raise ValueError("{}: not a compiled DFA".format(filepath))
+
+        if version != BINARY_VERSION:
+            raise ValueError("{}: compiled DFA format version {}, expected version {}"
+                             .format(filepath, version, BINARY_VERSION))
+
+        compiled = CompiledDfa.build_from_binary(data)
+
+        if compiled is None:
+            raise ValueError("{}: truncated compiled DFA".format(filepath))
+
+        return compiled
+
+    @staticmethod
+    def is_binary_file(filepath):
+        with open(filepath, "rb") as fd:
+            return fd.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+    def to_binary(self):
+        # return the DFA in the binary format
+        names = "\0".join(self.token_names).encode("utf-8")
+
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, self.state_count,
+                                    self.class_count, self.init_state, self.sink_state,
+                                    len(self.token_names), len(names),
+                                    len(self.partition.bounds))
+
+        sections = [array("I", self.partition.bounds),
+                    array("i", self.partition.interval_classes),
+                    array("i", self.accept_tokens),
+                    array("i", self.live_rules),
+                    array("i", self.table)]
+
+        if sys.byteorder == "big":
+            for section in sections:
+                section.byteswap()
+
+        return b"".join([header, names, b"\0" * (-len(names) % 4)]
+                        + list(map(lambda x: x.tobytes(), sections))
+                        + [bytes(self.accepting), bytes(self.dead)])
+
+    def write_binary(self, filepath):
+        with open(filepath, "wb") as fd:
+            fd.write(self.to_binary())
+
+    def get_token_name(self, token_id):
+        return self.token_names[token_id]
+
+    def step(self, state, char):
+        return self.table[state * self.class_count + self.partition.classify(char)]
+
+    def is_dead(self, state):
+        return self.dead[state] == 1
+
+    def is_accepting(self, state):
+        return self.accepting[state] == 1
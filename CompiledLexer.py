@@ -0,0 +1,50 @@
+from CompiledDfa import CompiledDfa
+from CompleteLexer import load_compiled_dfa
+from Dfa import Dfa
+from Lexer import Lexer, load_automatas
+
+
+class CompiledLexer:
+    # compiled lexer for a specification, built once and shared by any
+    # number of threads. It only holds the compiled DFA, whose tables are
+    # read-only views of its binary form, so scanning can't change it; the
+    # state of each run lives in a cursor (a Lexer) made by tokenize, and
+    # nothing needs to be locked or copied per thread.
+    def __init__(self, compiled_dfa):
+        self.compiled_dfa = CompiledDfa.build_from_binary(compiled_dfa.to_binary())
+
+    @staticmethod
+    def build_from_spec(lex_file, minimize=True, cache=None, workers=1):
+        return CompiledLexer(load_compiled_dfa(lex_file, minimize, cache, workers))
+
+    @staticmethod
+    def build_from_dfa(dfa):
+        # dfa is a combined DFA or a DFA recognising a single token
+        return CompiledLexer(CompiledDfa.build_from_dfa(dfa))
+
+    @staticmethod
+    def build_from_file(dfa_filepath):
+        # the file holds DFAs in the text codification or a compiled DFA in
+        # the binary format, as for Lexer.load_from_file
+        if CompiledDfa.is_binary_file(dfa_filepath):
+            return CompiledLexer(CompiledDfa.build_from_file(dfa_filepath))
+
+        return CompiledLexer.build_from_dfa(Dfa.build_combined(load_automatas(dfa_filepath)))
+
+    def get_token_names(self):
+        return list(self.compiled_dfa.token_names)
+
+    def cursor(self, word=None):
+        # lexer for a single run over word (see Lexer.run, run_tokens and
+        # tokenize_stream), sharing the compiled DFA
+        lexer = Lexer()
+        lexer.load_from_compiled_dfa(self.compiled_dfa, word)
+
+        return lexer
+
+    def tokenize(self, word, linear=False):
+        # the tokens of word as a TokenBuffer, see Lexer.run_tokens
+        return self.cursor(word).run_tokens(linear)
+
+    def tokenize_stream(self, fileobj, chunk_size=1 << 16):
+        return self.cursor().tokenize_stream(fileobj, chunk_size)
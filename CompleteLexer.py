@@ -1,102 +1,274 @@
+from Alphabet import *
+from CompiledDfa import *
+from SpecCache import *
+from LazyDfa import *
+from BitNfa import *
 from Regex import *
 from Dfa import *
 from Nfa import *
 from Lexer import *
 from AST import *
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import asyncio
+import glob
+import io
+import os
+import time
 
 
-def load_dfa_list(lex_file):
+# specifications with fewer rules are always compiled serially, starting
+# the worker processes would take longer than compiling them
+MIN_PARALLEL_RULES = 8
+
+
+def parse_rule(line):
+    # split a "TOKEN REGEX" rule and parse its regex
+
+    # extract DFA's token
+    dfa_token = line[:line.find(' ')]
+
+    # build the regex
+    regex_string = line[line.find(' ') + 1:]
+    regex = Regex.inverse_parse(Regex.to_prefix_form(regex_string))
+
+    return dfa_token, regex
+
+
+def compile_rule(args):
+    # build the DFA of a parsed rule over the given partition, straight
+    # from the regex if direct is set (see Dfa.build_from_regex); return the
+    # DFA along with its (states_before, states_after) counts when it was
+    # minimized
+    (dfa_token, regex, partition, minimize, direct) = args
+
+    if direct:
+        dfa = Dfa.build_from_regex(regex, dfa_token, partition)
+    else:
+        dfa = Dfa.build_from_nfa(Nfa.build_from_regex(regex, partition), dfa_token)
+
+    state_counts = None
+
+    if minimize:
+        state_counts = dfa.minimize()
+
+    return dfa, state_counts
+
+
+def load_dfa_list(lex_file, minimize=False, stats=None, workers=1, direct=False):
+    # when minimize is set every DFA is passed through Dfa.minimize; if a
+    # stats list is also given, a (token, states_before, states_after)
+    # tuple is appended to it for each DFA. With direct set the DFAs are
+    # built from the regexes without going through NFAs.
+    # The rules are independent of each other, so unless workers is 1 they
+    # are parsed and compiled in a pool of worker processes (as many as
+    # the machine has cores if workers is None); the DFAs are still
+    # returned in the order of the rules
     result = []
 
     # open specification file
     with open(lex_file, "r") as fd:
         content = fd.read().split(";\n")
 
-        for line in content[:-1]:
-            # extract DFA's token
-            dfa_token = line[:line.find(' ')]
+    lines = content[:-1]
+    executor = None
+    map_function = map
+
+    if workers != 1 and len(lines) >= MIN_PARALLEL_RULES:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        map_function = executor.map
+
+    try:
+        rules = list(map_function(parse_rule, lines))
 
-            # build the regex
-            regex_string = line[line.find(' ') + 1:]
-            regex = Regex.inverse_parse(Regex.to_prefix_form(regex_string))
+        # all the DFAs are built over the same partition of the characters,
+        # so that they can be combined without refining it
+        partition = AlphabetPartition.build_from_regex_list(list(map(lambda x: x[1], rules)))
 
-            # build the DFA
-            dfa = Dfa.build_from_nfa(Nfa.build_from_regex(regex), dfa_token)
+        compiled_rules = list(map_function(compile_rule,
+                                           map(lambda x: (x[0], x[1], partition, minimize, direct),
+                                               rules)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-            # add dfa to list of DFAs
-            result.append(dfa)
+    for ((dfa_token, regex), (dfa, state_counts)) in zip(rules, compiled_rules):
+        # DFAs built by the workers come back with copies of the partition
+        dfa.partition = partition
+
+        if stats is not None and state_counts is not None:
+            stats.append((dfa_token,) + tuple(state_counts))
+
+        # add dfa to list of DFAs
+        result.append(dfa)
 
     return result
 
 
-def runcompletelexer(lex_file, input_file, output_file):
-    dfa_list = []
-    word = None
+def load_combined_dfa(lex_file, minimize=False, stats=None, workers=1, direct=False):
+    # build a single DFA recognising every rule of the specification file,
+    # see Dfa.build_combined; minimize, stats, workers and direct are passed
+    # on to load_dfa_list and, when minimize is set, the combined DFA is
+    # minimized as well
+    dfa = Dfa.build_combined(load_dfa_list(lex_file, minimize, stats, workers, direct))
 
-    with open(input_file, "r") as fd:
-        word = fd.read()
+    if minimize:
+        dfa.minimize()
 
-    dfa_list = load_dfa_list(lex_file)
+    return dfa
 
-    # prepare lexer
-    lexer = Lexer()
-    lexer.load_from_dfa_list(dfa_list, word)
 
-    with open(output_file, "w") as fd:
-        lexer_output = lexer.run()
+def load_compiled_dfa(lex_file, minimize=False, cache=None, workers=1, direct=False):
+    # compiled form of load_combined_dfa; if a SpecCache is given, the
+    # automata are only built when it has no entry for the specification
+    if cache is None:
+        return CompiledDfa.build_from_dfa(load_combined_dfa(lex_file, minimize,
+                                                            workers=workers, direct=direct))
 
-        if not isinstance(lexer_output[0], tuple):
-            fd.write(lexer_output[0])
-        else:
-            for i in lexer_output:
-                token = i[0]
-                lexeme = i[1].replace("\n", "\\n")
+    # both constructions give the same language but not the same states,
+    # so direct is part of the key, only when set to keep the older entries
+    options = {"minimize": minimize}
 
-                fd.write(token + " " + lexeme + "\n")
+    if direct:
+        options["direct"] = True
 
+    with open(lex_file, "r") as fd:
+        key = cache.get_key(fd.read(), options)
 
-def runparser(input_file, output_file):
-    dfa_list = []
-    word = None
+    compiled_dfa = cache.load(key)
 
-    with open(input_file, "r") as fd:
-        word = fd.read()
+    if compiled_dfa is None:
+        compiled_dfa = CompiledDfa.build_from_dfa(load_combined_dfa(lex_file, minimize,
+                                                                    workers=workers,
+                                                                    direct=direct))
+        cache.store(key, compiled_dfa)
 
-    # load the DFA list from the language's specification file
-    dfa_list = load_dfa_list("imp.spec")
+    return compiled_dfa
 
-    # prepare lexer
-    lexer = Lexer()
-    lexer.load_from_dfa_list(dfa_list, word)
 
-    # run lexer
-    lexer_output = lexer.run()
+def load_lazy_dfa(lex_file, max_memory=DEFAULT_MAX_MEMORY):
+    # LazyDfa of the rules of the specification file: only their NFAs are
+    # built here, the DFA states are built while lexing and use at most
+    # about max_memory bytes along with the BitNfa running the NFAs
+    with open(lex_file, "r") as fd:
+        rules = list(map(parse_rule, fd.read().split(";\n")[:-1]))
 
-    # build AST from lexer output
-    ast = prepare_ast(lexer_output)
+    partition = AlphabetPartition.build_from_regex_list(list(map(lambda x: x[1], rules)))
+    nfa_list = list(map(lambda x: Nfa.build_from_regex(x[1], partition), rules))
+    lazy_dfa = LazyDfa.build_from_nfa_list(nfa_list, list(map(lambda x: x[0], rules)), max_memory)
+
+    if lazy_dfa is None:
+        raise ValueError("{}: the NFAs of the rules don't fit in {} bytes"
+                         .format(lex_file, max_memory))
+
+    return lazy_dfa
 
-    with open(output_file, "w") as fd:
-        fd.write(str(ast))
 
-def runinterpreter(input_file):
+def load_hybrid(lex_file, nfa_tokens=(), max_states=None, minimize=False):
+    # split the rules of the specification file between a compiled DFA and
+    # a BitNfa, for Lexer.load_from_hybrid: the rules whose token is in
+    # nfa_tokens, and with max_states set the ones whose DFA would have
+    # more states than that, are simulated as NFAs, so that they can't
+    # make building the DFA blow up. Return the compiled DFA and the
+    # BitNfa, which is None if every rule went to the DFA
+    with open(lex_file, "r") as fd:
+        rules = list(map(parse_rule, fd.read().split(";\n")[:-1]))
+
+    partition = AlphabetPartition.build_from_regex_list(list(map(lambda x: x[1], rules)))
     dfa_list = []
-    word = None
+    nfa_list = []
+    rule_ids = []
+
+    for (rule_id, (dfa_token, regex)) in enumerate(rules):
+        nfa = Nfa.build_from_regex(regex, partition)
+        dfa = None
+
+        if dfa_token not in nfa_tokens:
+            dfa = Dfa.build_from_nfa(nfa, dfa_token, max_states)
+
+        if dfa is None:
+            nfa_list.append(nfa)
+            rule_ids.append(rule_id)
+            continue
+
+        if minimize:
+            dfa.minimize()
+
+        dfa_list.append((rule_id, dfa))
+
+    if not nfa_list:
+        dfa = Dfa.build_combined(list(map(lambda x: x[1], dfa_list)))
+
+        if minimize:
+            dfa.minimize()
+
+        return CompiledDfa.build_from_dfa(dfa), None
+
+    bit_nfa = BitNfa.build_from_nfa_list(nfa_list, list(map(lambda x: x[0], rules)), rule_ids)
+
+    if not dfa_list:
+        return CompiledDfa.build_empty(partition), bit_nfa
+
+    # the DFA tells which rule it recognised, the BitNfa knows its token
+    for (rule_id, dfa) in dfa_list:
+        dfa.token = str(rule_id)
+
+    dfa = Dfa.build_combined(list(map(lambda x: x[1], dfa_list)))
+
+    if minimize:
+        dfa.minimize()
+
+    return CompiledDfa.build_from_dfa(dfa), bit_nfa
+
 
-    with open(input_file, "r") as fd:
-        word = fd.read()
+def runcompletelexer(lex_file, input_file, output_file, binary=False, cache=None):
+    # with binary set the input is mapped in memory and lexed as bytes,
+    # see load_word; cache is an optional SpecCache
+    dfa = None
+    word = load_word(input_file, binary)
 
-    # load the DFA list from the language's specification file
-    dfa_list = load_dfa_list("imp.spec")
+    dfa = load_compiled_dfa(lex_file, minimize=True, cache=cache)
 
     # prepare lexer
     lexer = Lexer()
-    lexer.load_from_dfa_list(dfa_list, word)
+    lexer.load_from_compiled_dfa(dfa, word)
+
+    with open(output_file, "w") as fd:
+        write_tokens(fd, lexer.run_tokens())
+
+
+def process_word(compiled_dfa, word, mode):
+    # lex the word and return, depending on mode, the text runcompletelexer
+    # writes ("lex"), the text runparser writes ("parse") or the variables
+    # runinterpreter returns ("interpret"); in the last two modes a lexing
+    # error raises a ValueError holding the lexer's error message
+    lexer = Lexer()
+    lexer.load_from_compiled_dfa(compiled_dfa, word)
 
     # run lexer
-    lexer_output = lexer.run()
+    tokens = lexer.run_tokens()
+
+    if mode == "lex":
+        output = io.StringIO()
+        write_tokens(output, tokens)
 
-    # build AST from lexer output
-    ast = prepare_ast(lexer_output)
+        return output.getvalue()
+
+    # the parser can't do anything with the lexer's error message, the
+    # callers (runbatch, LexerServer) report it instead
+    if tokens.error is not None:
+        raise ValueError(tokens.error)
+
+    if mode == "parse":
+        # build AST from lexer output, the parser needs the lexemes as strings
+        return str(prepare_ast(tokens.decoded()))
+
+    return interpret_tokens(tokens.decoded())
+
+
+def interpret_tokens(tokens):
+    # run the program made of the given (token, lexeme) pairs and return
+    # its variables
+    ast = prepare_ast(tokens)
 
     symbol_dict = dict()
 
@@ -105,6 +277,140 @@ def runinterpreter(input_file):
     return symbol_dict
 
 
+async def ainterpret(tokens, executor=None):
+    # interpret_tokens in an executor (the event loop's default one if
+    # executor is None), so the event loop goes on while the program runs;
+    # with a process pool the tokens must be a list, e.g. the pairs
+    # collected from Lexer.atokenize
+    return await asyncio.get_running_loop().run_in_executor(executor, interpret_tokens,
+                                                            tokens)
+
+
+def runparser(input_file, output_file, binary=False, cache=None):
+    word = load_word(input_file, binary)
+
+    # load the combined DFA from the language's specification file
+    dfa = load_compiled_dfa("imp.spec", minimize=True, cache=cache)
+
+    with open(output_file, "w") as fd:
+        fd.write(process_word(dfa, word, "parse"))
+
+
+def runinterpreter(input_file, binary=False, cache=None):
+    word = load_word(input_file, binary)
+
+    # load the combined DFA from the language's specification file
+    dfa = load_compiled_dfa("imp.spec", minimize=True, cache=cache)
+
+    return process_word(dfa, word, "interpret")
+
+
+# compiled DFA of a worker process of runbatch
+batch_dfa = None
+
+
+def init_batch_worker(binary_dfa):
+    global batch_dfa
+
+    batch_dfa = CompiledDfa.build_from_binary(binary_dfa)
+
+
+def process_file(task):
+    # process an input file of runbatch with the worker's DFA; return the
+    # file, its result and its size, the result being the exception raised
+    # if the file couldn't be processed, so that one bad file doesn't stop
+    # the batch
+    (input_file, mode, binary, output_file) = task
+
+    try:
+        word = load_word(input_file, binary)
+        result = process_word(batch_dfa, word, mode)
+
+        if output_file is not None:
+            with open(output_file, "w") as fd:
+                fd.write(result)
+
+            result = output_file
+
+        return input_file, result, os.path.getsize(input_file)
+    except Exception as error:
+        return input_file, error, 0
+
+
+def runbatch(inputs, mode="lex", lex_file="imp.spec", output_dir=None, workers=None,
+             binary=False, cache=None, stats=None):
+    # process many input files (a list of paths or a glob pattern) with a
+    # single compilation of the specification, see process_word for the
+    # modes. The files are handed to a pool of worker processes (as many
+    # as the machine has cores if workers is None, none if it is 1), each
+    # of them receiving the compiled DFA once, in its binary form.
+    # A (input_file, result) pair is yielded for every file, as soon as it
+    # is done; for a file that failed (e.g. a program with a lexing or
+    # parse error in "interpret" mode) the result is the exception raised. With
+    # output_dir, the "lex" and "parse" results are written to
+    # output_dir/<file name>.out or .ast instead and the result is the path
+    # of that file. If a stats dict is given, the number of files, failed
+    # files and bytes processed, the time taken and the throughput in
+    # files/s and bytes/s are stored in it once every file is done.
+    if isinstance(inputs, str):
+        inputs = sorted(glob.glob(inputs))
+
+    binary_dfa = load_compiled_dfa(lex_file, minimize=True, cache=cache).to_binary()
+
+    tasks = []
+
+    for input_file in inputs:
+        output_file = None
+
+        if output_dir is not None and mode != "interpret":
+            output_file = os.path.join(output_dir, os.path.basename(input_file)
+                                       + (".out" if mode == "lex" else ".ast"))
+
+        tasks.append((input_file, mode, binary, output_file))
+
+    file_count = 0
+    failed_count = 0
+    byte_count = 0
+    start_time = time.perf_counter()
+
+    if workers == 1:
+        init_batch_worker(binary_dfa)
+
+        for (input_file, result, size) in map(process_file, tasks):
+            file_count += 1
+            byte_count += size
+
+            if isinstance(result, Exception):
+                failed_count += 1
+
+            yield input_file, result
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker,
+                                       initargs=(binary_dfa,))
+
+        try:
+            futures = list(map(lambda x: executor.submit(process_file, x), tasks))
+
+            for future in as_completed(futures):
+                (input_file, result, size) = future.result()
+                file_count += 1
+                byte_count += size
+
+                if isinstance(result, Exception):
+                    failed_count += 1
 
+                yield input_file, result
+        finally:
+            # if the caller stops early, the files not started are dropped
+            # instead of being processed for nothing
+            executor.shutdown(cancel_futures=True)
 
+    if stats is not None:
+        seconds = time.perf_counter() - start_time
 
+        stats["files"] = file_count
+        stats["failed"] = failed_count
+        stats["bytes"] = byte_count
+        stats["seconds"] = seconds
+        stats["files_per_second"] = file_count / seconds if seconds > 0 else 0.0
+        stats["bytes_per_second"] = byte_count / seconds if seconds > 0 else 0.0
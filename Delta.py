@@ -28,6 +28,40 @@ class Delta:
         # the from states can be found at index 2 of every transition
         self.to_state_list = build_state_list(2)
 
+        # build the lookup index for the parsed transitions
+        self.build_index()
+
+    def build_index(self):
+        # the parallel lists are kept as the canonical representation, the
+        # index only mirrors them and has to be rebuilt whenever they are
+        # reordered or rewritten as a whole
+
+        # symbol_index maps from_state -> symbol -> [to_state, ...]
+        self.symbol_index = dict()
+
+        # state_index maps from_state -> [to_state, ...] regardless of symbol
+        self.state_index = dict()
+
+        for (from_state, symbol, to_state) in zip(self.from_state_list,
+                                                  self.symbol_list,
+                                                  self.to_state_list):
+            self.index_transition(from_state, symbol, to_state)
+
+    def index_transition(self, from_state, symbol, to_state):
+        symbol_dict = self.symbol_index.get(from_state)
+
+        if symbol_dict is None:
+            symbol_dict = dict()
+            self.symbol_index[from_state] = symbol_dict
+            self.state_index[from_state] = []
+
+        if symbol in symbol_dict:
+            symbol_dict[symbol].append(to_state)
+        else:
+            symbol_dict[symbol] = [to_state]
+
+        self.state_index[from_state].append(to_state)
+
     def add_transition(self, transition):
         # transition = [from_state, symbol, to_state]
         from_state = transition[0]
@@ -38,6 +72,9 @@ class Delta:
         self.symbol_list.append(symbol)
         self.to_state_list.append(to_state)
 
+        # keep the index in sync with the lists
+        self.index_transition(from_state, symbol, to_state)
+
     def __str__(self):
         string_rep = ""
         for i in range(0, len(self.symbol_list)):
@@ -49,52 +86,54 @@ class Delta:
         return string_rep
 
     def get_transitions(self, state, symbol):
+        # the returned list is the one stored in the index, so callers
+        # must treat it as read-only
         if symbol is None:
             # look for any transitions from provided state
-            result = list(filter(lambda x: x[0] == state,
-                                 zip(self.from_state_list, self.symbol_list, self.to_state_list)))
-
-            # only leave out the to_states in the result list
-            result = list(map(lambda x: x[2], result))
-
-            if not result:
-                # no matching entry
-                return None
-            else:
-                # return to_state list
-                return result
+            result = self.state_index.get(state)
         else:
             # look for entries of format (state, symbol, _)
-            result = list(filter(lambda x: x[0] == state and x[1] == symbol,
-                                 zip(self.from_state_list, self.symbol_list, self.to_state_list)))
-
-            # only leave out the to_states in the result list
-            result = list(map(lambda x: x[2], result))
+            symbol_dict = self.symbol_index.get(state)
 
-            if not result:
-                # no matching entry
+            if symbol_dict is None:
                 return None
-            else:
-                # return to_state list
-                return result
+
+            result = symbol_dict.get(symbol)
+
+        if not result:
+            # no matching entry
+            return None
+        else:
+            # return to_state list
+            return result
+
+    def get_symbol_transitions(self, state):
+        # return a dictionary mapping every symbol with a transition from
+        # provided state to its to_state list; like get_transitions the
+        # result is part of the index and must not be modified
+        return self.symbol_index.get(state)
 
     def reverse(self):
         tmp = self.from_state_list
         self.from_state_list = self.to_state_list
         self.to_state_list = tmp
 
+        self.build_index()
+
     def __add__(self, other):
         if not isinstance(other, Delta):
             return None
 
-        self.from_state_list, self.symbol_list, self.to_state_list \
-            = zip(*list(set(zip(self.from_state_list, self.symbol_list, self.to_state_list))
-                        .union(set(zip(other.from_state_list, other.symbol_list, other.to_state_list)))))
+        # only the transitions of other missing from the index are added,
+        # so that chaining additions, as a long union of regexes does, takes
+        # time linear in the transitions added
+        for (from_state, symbol, to_state) in zip(other.from_state_list,
+                                                  other.symbol_list,
+                                                  other.to_state_list):
+            to_states = self.get_transitions(from_state, symbol)
 
-        # convert the class variables back to lists
-        self.from_state_list = list(self.from_state_list)
-        self.symbol_list = list(self.symbol_list)
-        self.to_state_list = list(self.to_state_list)
+            if to_states is None or to_state not in to_states:
+                self.add_transition([from_state, symbol, to_state])
 
         return self
 
@@ -104,9 +143,23 @@ class Delta:
         self.to_state_list = list(map(lambda x: state_map_dictionary[x],
                                       self.to_state_list))
 
+        self.build_index()
+
+    def remap_symbols(self, symbol_map_dictionary):
+        self.symbol_list = list(map(lambda x: symbol_map_dictionary[x],
+                                    self.symbol_list))
+
+        self.build_index()
+
     def sort(self):
         transitions = list(zip(self.from_state_list, self.symbol_list, self.to_state_list))
 
         transitions.sort()
 
-        self.from_state_list, self.symbol_list, self.to_state_list = zip(*transitions)
+        # unzip the sorted transitions back into lists so that new
+        # transitions can still be appended afterwards
+        self.from_state_list = list(map(lambda x: x[0], transitions))
+        self.symbol_list = list(map(lambda x: x[1], transitions))
+        self.to_state_list = list(map(lambda x: x[2], transitions))
+
+        self.build_index()
@@ -1,7 +1,18 @@
+from collections import deque
 from functools import reduce
+from Alphabet import AlphabetPartition
 from Delta import Delta
+from Regex import CharClass, Concat, Plus, Star, Union, Var
 from State import State
 
+# largest character class written out in the text codification, which
+# lists a transition for every character of a class
+MAX_CODIFICATION_CHARS = 1 << 10
+
+# state a DFA without sink states moves to when it has no transition; it
+# isn't part of any DFA, so stepping never has to add it to one
+DEAD_STATE = State.build_from_int(-1)
+
 
 class Dfa:
     def __init__(self):
@@ -13,6 +24,17 @@ class Dfa:
         self.delta = None
         self.sink_states = None
 
+        # partition of the characters whose classes are the symbols of the
+        # DFA, see AlphabetPartition
+        self.partition = None
+
+        # only set for DFAs built by build_combined: the token recognised
+        # by each final state and the number of rules still alive in each
+        # state
+        self.state_tokens = None
+        self.live_rules = None
+        self.rule_tokens = None
+
     @staticmethod
     def build_from_codification(codification):
         dfa = Dfa()
@@ -59,6 +81,13 @@ class Dfa:
 
         dfa.delta = build_delta()
 
+        # every character of the codification becomes a class of its own
+        dfa.partition = AlphabetPartition.build_from_chars(set(dfa.alphabet)
+                                                           .union(dfa.delta.symbol_list))
+        dfa.delta.remap_symbols(dict(map(lambda x: (x, dfa.partition.classify(x)),
+                                         set(dfa.delta.symbol_list))))
+        dfa.alphabet = sorted(set(map(lambda x: dfa.partition.classify(x), dfa.alphabet)))
+
         def compute_sink_states():
             reachable_states = []
 
@@ -105,161 +134,633 @@ class Dfa:
         return dfa
 
     @staticmethod
-    def build_from_nfa(nfa, token="DFA"):
+    def build_from_nfa(nfa, token="DFA", max_states=None):
+        # with max_states set, give up and return None as soon as the DFA
+        # has more states than that
         dfa = Dfa()
-        dfa.final_states = []
         dfa.token = token
         dfa.delta = Delta([])
-        dfa.sink_states = [State.build_from_int(-1)]
-        dfa.alphabet = nfa.get_alphabet()
-
-        # add necessary transitions for sink state
-        for symbol in dfa.alphabet:
-            dfa.delta.add_transition([dfa.sink_states[0], symbol, dfa.sink_states[0]])
-
-        # compute the eps-closure for each state in the NFA
-        def compute_closure_dictionary():
-            def dfs(crt, state_list):
-                # no epsilon transitions, just return
-                if nfa.get_delta().get_transitions(crt, "eps") is None:
-                    return
-
-                for neigh in nfa.get_delta().get_transitions(crt, "eps"):
-                    if neigh not in state_list:
-                        state_list.append(neigh)
-                        dfs(neigh, state_list)
-
-            result = dict()
-
-            for state in nfa.get_state_set():
-                # initially add just the state to the list
-                result[state] = [state]
-
-                # prepare a list containing all states reachable
-                # from current state using epsilon-transitions
-                eps_state_list = []
-
-                # compute list of states reachable using eps-transitions
-                dfs(state, eps_state_list)
-
-                # append resulting list to current state's eps-closure
-                result[state] += eps_state_list
-
-            return result
-
-        closure_dict = compute_closure_dictionary()
-
-        # build DFA's initial state by using NFA's initial state's eps-closure
-        init_state = reduce(lambda x, y: x + y, closure_dict[nfa.get_init_state()], State())
-
-        dfa.init_state = init_state
-        dfa.state_set = [init_state]
-
-        # if the initial state contains the final state of the NFA then
-        # add it to the set of final states for the DFA
-        if nfa.get_final_states()[-1] in init_state:
-            dfa.final_states.append(init_state)
-
-        # iterate through the DFA's state set and new states and
-        # transitions on the go
-        for state in dfa.state_set:
-            # iterate through each symbol in order to
-            # add new states and transitions made on that
-            # symbol
-            for symbol in dfa.alphabet:
-                # iterate through each component of the state
-                # and find the reachable states on given symbol
-                reachable_states = []
-
-                for component in state.components:
-                    transitions = nfa.get_delta() \
-                        .get_transitions(State.build_from_int(component), symbol)
-
-                    if transitions is not None:
-                        # map every state in transition list to its eps-closure
-                        transition_closures = list(map(lambda x: closure_dict[x.get_component_states()[0]],
-                                                       transitions))
-
-                        # merge the elements found in the list of closures and append
-                        # the result to reachable states list
-                        reachable_states += reduce(lambda x, y: x + y,
-                                                   transition_closures,
-                                                   [])
-
-                if reachable_states:
-                    # remove duplicate states if any
-                    reachable_states = list(set(reachable_states))
-
-                    # create a single state out of all the reachable states
-                    reachable_state = reduce(lambda x, y: x + y, reachable_states, State())
-
-                    # check if the new state contains NFA's final state
-                    if nfa.get_final_states()[-1] in reachable_state:
-                        if reachable_state not in dfa.final_states:
-                            dfa.final_states.append(reachable_state)
-
-                    # add the new state to state set
-                    if reachable_state not in dfa.state_set:
-                        dfa.state_set.append(reachable_state)
-
-                    # add a new transition from current state to reachable state
-                    dfa.delta.add_transition([state, symbol, reachable_state])
+        dfa.alphabet = sorted(nfa.get_alphabet())
+        dfa.partition = nfa.partition
+
+        # eps-closure of each NFA state, keyed by the state's value
+        closure_dict = nfa.get_eps_closures()
+
+        nfa_final = nfa.get_final_states()[-1].components[0]
+
+        # every DFA state is identified by the set of NFA states it stands
+        # for; the map gives the id of each set discovered so far and the
+        # list gives the set of each id
+        init_set = closure_dict[nfa.get_init_state().components[0]]
+        set_ids = {init_set: 0}
+        set_list = [init_set]
+
+        # sets are explored in FIFO order, so ids are handed out in the
+        # order the sets are first reached
+        worklist = deque([init_set])
+        transitions = []
+
+        while worklist:
+            crt_set = worklist.popleft()
+            crt_id = set_ids[crt_set]
+
+            # gather the NFA states reachable on every symbol that actually
+            # labels an outgoing transition of one of the components
+            moves = dict()
+
+            for component in crt_set:
+                symbol_dict = nfa.get_delta().get_symbol_transitions(State.build_from_int(component))
+
+                if symbol_dict is None:
+                    continue
+
+                for (symbol, to_states) in symbol_dict.items():
+                    if symbol == "eps":
+                        continue
+
+                    reachable = moves.get(symbol)
+
+                    if reachable is None:
+                        reachable = set()
+                        moves[symbol] = reachable
+
+                    for to_state in to_states:
+                        reachable |= closure_dict[to_state.components[0]]
+
+            for symbol in sorted(moves):
+                reachable_set = frozenset(moves[symbol])
+                reachable_id = set_ids.get(reachable_set)
+
+                if reachable_id is None:
+                    # first time we reach this set of NFA states
+                    reachable_id = len(set_list)
+
+                    if max_states is not None and reachable_id >= max_states:
+                        return None
+
+                    set_ids[reachable_set] = reachable_id
+                    set_list.append(reachable_set)
+                    worklist.append(reachable_set)
+
+                transitions.append((crt_id, symbol, reachable_id))
+
+        # symbols without a transition implicitly lead to the sink state,
+        # which gets the last id and has no transitions of its own
+        sink_id = len(set_list)
+
+        dfa.state_set = list(map(lambda x: State.build_from_int(x), range(sink_id + 1)))
+        dfa.init_state = dfa.state_set[0]
+        dfa.sink_states = [dfa.state_set[sink_id]]
+
+        # a DFA state is final if it contains the final state of the NFA
+        dfa.final_states = [dfa.state_set[i] for i in range(sink_id)
+                            if nfa_final in set_list[i]]
+
+        # ids were handed out in the order the states were explored and the
+        # symbols of each state were walked in order, so the transitions are
+        # already sorted
+        for (from_id, symbol, to_id) in transitions:
+            dfa.delta.add_transition([dfa.state_set[from_id], symbol, dfa.state_set[to_id]])
+
+        return dfa
+
+    @staticmethod
+    def build_from_regex(regex, token="DFA", partition=None, max_states=None):
+        # build the DFA of regex directly from its syntax tree, without an
+        # NFA: every Var or CharClass leaf is a position, and a DFA state is
+        # the set of positions that may match the next character (followpos
+        # construction). An extra end position follows the positions a match
+        # may end with, the final states being the ones holding it. The
+        # symbols are the classes of partition, or of the partition of the
+        # character sets of regex if none is given; max_states is the same
+        # as for build_from_nfa
+        if partition is None:
+            partition = AlphabetPartition.build_from_regex_list([regex])
+
+        # per position: the symbols it matches, and the positions that may
+        # follow it as a bitmask
+        position_symbols = []
+        follow_masks = []
+
+        def add_follow(positions, follow):
+            # follow may come after every position in positions
+            while positions:
+                low_bit = positions & -positions
+                follow_masks[low_bit.bit_length() - 1] |= follow
+                positions ^= low_bit
+
+        # nullable, firstpos and lastpos of the nodes walked so far, positions
+        # being bitmasks. The tree is walked in post-order with an explicit
+        # stack, so that a long rule can't hit the recursion limit: a node is
+        # pushed back above its children, and once they are done it takes
+        # their results, adds the follows it implies and leaves its own
+        results = []
+        stack = [(regex, False)]
+
+        while stack:
+            (node, children_done) = stack.pop()
+
+            if isinstance(node, Var) or isinstance(node, CharClass):
+                if isinstance(node, Var):
+                    position_symbols.append([partition.classify(node.get_symbol())])
+                else:
+                    position_symbols.append(partition.get_classes(node.get_ranges()))
+
+                follow_masks.append(0)
+                position = 1 << (len(position_symbols) - 1)
+
+                results.append((False, position, position))
+                continue
+
+            is_repetition = isinstance(node, Star) or isinstance(node, Plus)
+
+            if not is_repetition and not isinstance(node, Union) \
+                    and not isinstance(node, Concat):
+                raise ValueError("unknown regex node {}".format(type(node).__name__))
+
+            if not children_done:
+                stack.append((node, True))
+
+                # the positions are numbered from left to right
+                if is_repetition:
+                    stack.append((node.get_regex(), False))
                 else:
-                    # add transition to sink state
-                    dfa.delta.add_transition([state, symbol, dfa.sink_states[0]])
+                    stack.append((node.get_right_regex(), False))
+                    stack.append((node.get_left_regex(), False))
+
+                continue
+
+            if is_repetition:
+                (nullable, first, last) = results.pop()
+
+                # a repetition may start over after any of its last positions
+                add_follow(last, first)
+
+                results.append((nullable or isinstance(node, Star), first, last))
+                continue
+
+            (r_nullable, r_first, r_last) = results.pop()
+            (l_nullable, l_first, l_last) = results.pop()
+
+            if isinstance(node, Union):
+                results.append((l_nullable or r_nullable, l_first | r_first, l_last | r_last))
+                continue
+
+            # the right side of a concatenation follows the end of its left
+            add_follow(l_last, r_first)
+
+            results.append((l_nullable and r_nullable,
+                            l_first | r_first if l_nullable else l_first,
+                            l_last | r_last if r_nullable else r_last))
+
+        (nullable, first, last) = results.pop()
+
+        end_mask = 1 << len(position_symbols)
+        add_follow(last, end_mask)
+
+        dfa = Dfa()
+        dfa.token = token
+        dfa.delta = Delta([])
+        dfa.alphabet = sorted(set(symbol for symbols in position_symbols for symbol in symbols))
+        dfa.partition = partition
+
+        # like in build_from_nfa, ids are handed out in the order the sets
+        # of positions are first reached
+        init_set = first | end_mask if nullable else first
+        set_ids = {init_set: 0}
+        set_list = [init_set]
+        worklist = deque([init_set])
+        transitions = []
+
+        while worklist:
+            crt_set = worklist.popleft()
+            crt_id = set_ids[crt_set]
+
+            moves = dict()
+            positions = crt_set & (end_mask - 1)
+
+            while positions:
+                low_bit = positions & -positions
+                position = low_bit.bit_length() - 1
+                positions ^= low_bit
+
+                for symbol in position_symbols[position]:
+                    moves[symbol] = moves.get(symbol, 0) | follow_masks[position]
+
+            for symbol in sorted(moves):
+                reachable_set = moves[symbol]
+                reachable_id = set_ids.get(reachable_set)
+
+                if reachable_id is None:
+                    reachable_id = len(set_list)
+
+                    if max_states is not None and reachable_id >= max_states:
+                        return None
+
+                    set_ids[reachable_set] = reachable_id
+                    set_list.append(reachable_set)
+                    worklist.append(reachable_set)
+
+                transitions.append((crt_id, symbol, reachable_id))
+
+        # the sink state gets the last id, as in build_from_nfa
+        sink_id = len(set_list)
+
+        dfa.state_set = list(map(lambda x: State.build_from_int(x), range(sink_id + 1)))
+        dfa.init_state = dfa.state_set[0]
+        dfa.sink_states = [dfa.state_set[sink_id]]
+        dfa.final_states = [dfa.state_set[i] for i in range(sink_id) if set_list[i] & end_mask]
+
+        for (from_id, symbol, to_id) in transitions:
+            dfa.delta.add_transition([dfa.state_set[from_id], symbol, dfa.state_set[to_id]])
+
+        return dfa
+
+    @staticmethod
+    def build_combined(dfa_list):
+        # build a single DFA that runs all the DFAs in dfa_list side by side
+        # (product construction); a combined state is final if any of the
+        # component states is, and recognises the token of the first such
+        # DFA in the list, so earlier rules win ties just like in the Lexer
+        dfa = Dfa()
+        dfa.token = "DFA"
+        dfa.delta = Delta([])
+
+        # the components may use different partitions of the characters, in
+        # which case the combined DFA uses the coarsest partition refining
+        # all of them; class_maps[i][symbol] gives the symbol of component i
+        # standing for a symbol of the combined DFA
+        partitions = list(map(lambda x: x.partition, dfa_list))
+
+        if all(map(lambda x: x is partitions[0], partitions)):
+            dfa.partition = partitions[0]
+            class_maps = list(map(lambda x: list(range(x.class_count)), partitions))
+        else:
+            (dfa.partition, class_maps) = AlphabetPartition.build_joint(partitions)
+
+        # joint_symbols[i][symbol] is the inverse mapping, listing the
+        # symbols of the combined DFA standing for a symbol of component i
+        joint_symbols = []
+
+        for class_map in class_maps:
+            inverse = dict()
 
-        # add sink state to state set
-        dfa.state_set.append(State.build_from_int(-1))
+            for (joint_symbol, symbol) in enumerate(class_map):
+                inverse.setdefault(symbol, []).append(joint_symbol)
 
-        # build state remapping dictionary
-        state_counter = 0
+            joint_symbols.append(inverse)
 
-        state_map_dictionary = dict()
+        def component_state(component, state):
+            # a component that reached one of its sink states is dead and is
+            # represented by None from then on
+            if state is None or component.is_sink_state(state):
+                return None
 
-        for state in dfa.state_set:
-            state_map_dictionary[state] = State.build_from_int(state_counter)
-            state_counter += 1
+            return state
 
-        dfa.init_state = state_map_dictionary[dfa.init_state]
-        dfa.final_states = list(map(lambda x: state_map_dictionary[x], dfa.final_states))
-        dfa.state_set = list(map(lambda x: state_map_dictionary[x], dfa.state_set))
-        dfa.sink_states = list(map(lambda x: state_map_dictionary[x], dfa.sink_states))
-        dfa.delta.remap_states(state_map_dictionary)
-        dfa.delta.sort()
-        dfa.alphabet.sort()
+        def component_step(component_idx, state, symbol):
+            if state is None:
+                return None
+
+            component = dfa_list[component_idx]
+            to_states = component.delta.get_transitions(state,
+                                                        class_maps[component_idx][symbol])
+
+            if to_states is None:
+                return None
+
+            return component_state(component, to_states[0])
+
+        def is_dead(state_tuple):
+            return all(map(lambda x: x is None, state_tuple))
+
+        init_tuple = tuple(map(lambda x: component_state(x, x.get_init_state()), dfa_list))
+
+        # combined states are tuples of component states; like in
+        # build_from_nfa they get their ids in the order they are explored
+        tuple_ids = dict()
+        tuple_list = []
+        worklist = deque()
+        transitions = []
+
+        if not is_dead(init_tuple):
+            tuple_ids[init_tuple] = 0
+            tuple_list.append(init_tuple)
+            worklist.append(init_tuple)
+
+        while worklist:
+            crt_tuple = worklist.popleft()
+            crt_id = tuple_ids[crt_tuple]
+
+            # only the symbols some live component has a transition on can
+            # lead anywhere but the sink
+            symbols = set()
+
+            for (component_idx, state) in enumerate(crt_tuple):
+                if state is not None:
+                    symbol_dict = dfa_list[component_idx].delta.get_symbol_transitions(state)
+
+                    if symbol_dict is not None:
+                        for component_symbol in symbol_dict:
+                            symbols.update(joint_symbols[component_idx].get(component_symbol, []))
+
+            for symbol in sorted(symbols):
+                next_tuple = tuple(map(lambda x, y: component_step(x, y, symbol),
+                                       range(len(dfa_list)), crt_tuple))
+
+                # the tuple of dead components is the implicit sink
+                if is_dead(next_tuple):
+                    continue
+
+                next_id = tuple_ids.get(next_tuple)
+
+                if next_id is None:
+                    next_id = len(tuple_list)
+                    tuple_ids[next_tuple] = next_id
+                    tuple_list.append(next_tuple)
+                    worklist.append(next_tuple)
+
+                transitions.append((crt_id, symbol, next_id))
+
+        sink_id = len(tuple_list)
+
+        dfa.state_set = list(map(lambda x: State.build_from_int(x), range(sink_id + 1)))
+        dfa.init_state = dfa.state_set[0]
+        dfa.sink_states = [dfa.state_set[sink_id]]
+        dfa.final_states = []
+        dfa.state_tokens = dict()
+        dfa.live_rules = {dfa.sink_states[0]: 0}
+        dfa.rule_tokens = list(map(lambda x: x.get_token(), dfa_list))
+
+        for (state_id, state_tuple) in enumerate(tuple_list):
+            state = dfa.state_set[state_id]
+            dfa.live_rules[state] = len(list(filter(lambda x: x is not None, state_tuple)))
+
+            for (component, state_component) in zip(dfa_list, state_tuple):
+                if state_component is not None and component.is_final_state(state_component):
+                    dfa.final_states.append(state)
+                    dfa.state_tokens[state] = component.get_token()
+                    break
+
+        for (from_id, symbol, to_id) in transitions:
+            dfa.delta.add_transition([dfa.state_set[from_id], symbol, dfa.state_set[to_id]])
+
+        dfa.alphabet = sorted(set(dfa.delta.symbol_list))
 
         return dfa
 
+    def minimize(self):
+        # minimize the DFA in place using Hopcroft's partition refinement;
+        # unreachable states are dropped and every state that can't reach
+        # a final state is merged into a single sink state, reached through
+        # implicit transitions just like the one built by build_from_nfa.
+        # returns the number of states before and after minimization
+        states_before = len(self.state_set)
+        final_set = set(self.final_states)
+
+        # states may only be merged if they have the same label; for a
+        # combined DFA that means recognising the same token and having the
+        # same number of live rules
+        if self.state_tokens is None:
+            def label(state):
+                return state in final_set
+        else:
+            def label(state):
+                return self.state_tokens.get(state), self.live_rules[state]
+
+        # find the states reachable from the initial state
+        reachable = {self.init_state}
+        queue = deque([self.init_state])
+
+        while queue:
+            state = queue.popleft()
+            symbol_dict = self.delta.get_symbol_transitions(state)
+
+            if symbol_dict is None:
+                continue
+
+            for to_states in symbol_dict.values():
+                for to_state in to_states:
+                    if to_state not in reachable:
+                        reachable.add(to_state)
+                        queue.append(to_state)
+
+        # build the inverse transitions between reachable states, grouped
+        # by symbol: inverse[symbol][to_state] = [from_state, ...]
+        inverse = dict()
+
+        for state in reachable:
+            symbol_dict = self.delta.get_symbol_transitions(state)
+
+            if symbol_dict is None:
+                continue
+
+            for (symbol, to_states) in symbol_dict.items():
+                symbol_inverse = inverse.setdefault(symbol, dict())
+                symbol_inverse.setdefault(to_states[0], []).append(state)
+
+        # find the live states, which can still reach a final state
+        live = set(filter(lambda x: x in final_set, reachable))
+        queue = deque(live)
+
+        while queue:
+            state = queue.popleft()
+
+            for symbol_inverse in inverse.values():
+                for from_state in symbol_inverse.get(state, []):
+                    if from_state not in live:
+                        live.add(from_state)
+                        queue.append(from_state)
+
+        # the dead states are left out of the partition: they all end up in
+        # the sink, which is never needed as a splitter because a transition
+        # into it is told apart by the splitters of the live blocks
+        labelled_blocks = dict()
+
+        for state in live:
+            labelled_blocks.setdefault(label(state), set()).add(state)
+
+        blocks = []
+        block_of = dict()
+
+        for block in labelled_blocks.values():
+            for state in block:
+                block_of[state] = len(blocks)
+
+            blocks.append(block)
+
+        # since the transitions are partial, every initial block has to be
+        # used as a splitter
+        worklist = deque(range(len(blocks)))
+
+        while worklist:
+            splitter_idx = worklist.popleft()
+            splitter = list(blocks[splitter_idx])
+
+            for symbol_inverse in inverse.values():
+                # collect the live predecessors of the splitter on symbol,
+                # grouped by the block they belong to
+                touched = dict()
+
+                for state in splitter:
+                    for from_state in symbol_inverse.get(state, []):
+                        if from_state in block_of:
+                            touched.setdefault(block_of[from_state], set()).add(from_state)
+
+                for (block_idx, inside) in touched.items():
+                    block = blocks[block_idx]
+
+                    if len(inside) == len(block):
+                        continue
+
+                    # split the block, the larger half keeps its index
+                    outside = block - inside
+
+                    if len(inside) > len(outside):
+                        (inside, outside) = (outside, inside)
+
+                    new_idx = len(blocks)
+                    blocks[block_idx] = outside
+                    blocks.append(inside)
+
+                    for state in inside:
+                        block_of[state] = new_idx
+
+                    # if the old block is still waiting it now stands for the
+                    # larger half and both halves get processed, otherwise
+                    # processing the smaller half is enough
+                    worklist.append(new_idx)
+
+        # number the blocks in the order they are reached from the initial
+        # state, walking the symbols in order; the sink comes last
+        symbols = sorted(inverse)
+        block_ids = dict()
+        transitions = []
+
+        if self.init_state in block_of:
+            block_ids[block_of[self.init_state]] = 0
+            queue = deque([block_of[self.init_state]])
+
+            while queue:
+                block_idx = queue.popleft()
+                representative = next(iter(blocks[block_idx]))
+
+                for symbol in symbols:
+                    to_states = self.delta.get_transitions(representative, symbol)
+
+                    # transitions into dead states are left implicit
+                    if to_states is None or to_states[0] not in block_of:
+                        continue
+
+                    to_idx = block_of[to_states[0]]
+
+                    if to_idx not in block_ids:
+                        block_ids[to_idx] = len(block_ids)
+                        queue.append(to_idx)
+
+                    transitions.append((block_ids[block_idx], symbol, block_ids[to_idx]))
+
+        sink_id = len(block_ids)
+
+        self.state_set = list(map(lambda x: State.build_from_int(x), range(sink_id + 1)))
+        self.init_state = self.state_set[0]
+        self.sink_states = [self.state_set[sink_id]]
+        self.final_states = [self.state_set[block_id] for (block_idx, block_id) in block_ids.items()
+                             if next(iter(blocks[block_idx])) in final_set]
+        self.final_states.sort()
+
+        if self.state_tokens is not None:
+            # carry the labels over to the merged states
+            state_tokens = dict()
+            live_rules = {self.sink_states[0]: 0}
+
+            for (block_idx, block_id) in block_ids.items():
+                representative = next(iter(blocks[block_idx]))
+                live_rules[self.state_set[block_id]] = self.live_rules[representative]
+
+                if representative in self.state_tokens:
+                    state_tokens[self.state_set[block_id]] = self.state_tokens[representative]
+
+            self.state_tokens = state_tokens
+            self.live_rules = live_rules
+
+        self.delta = Delta([])
+
+        for (from_id, symbol, to_id) in transitions:
+            self.delta.add_transition([self.state_set[from_id], symbol, self.state_set[to_id]])
+
+        return states_before, len(self.state_set)
+
+    def get_codification_chars(self, symbol_class):
+        # the characters a class is written as in the text codification;
+        # raise ValueError if it can't be, either because it is too large
+        # or because of a character the line and comma based format (or
+        # the file encoding) can't hold
+        ranges = self.partition.get_class_ranges(symbol_class)
+
+        if sum(map(lambda x: x[1] - x[0] + 1, ranges)) > MAX_CODIFICATION_CHARS:
+            raise ValueError("a character class of the DFA is too large for the text "
+                             "codification, write the DFA in the binary format "
+                             "(main.py input output --binary)")
+
+        chars = self.partition.get_class_chars(symbol_class)
+
+        for char in chars:
+            if char == "," or 0xD800 <= ord(char) <= 0xDFFF:
+                raise ValueError("character {!r} can't be written in the text codification, "
+                                 "write the DFA in the binary format "
+                                 "(main.py input output --binary)".format(char))
+
+        return chars
+
     def __str__(self):
-        alphabet = "".join(self.alphabet) + "\n"
+        # the codification works with characters, so each transition on a
+        # class is listed once for every character of the class; newlines
+        # are written as \n, which build_from_codification reads back
+        chars = dict(map(lambda x: (x, self.get_codification_chars(x)), self.alphabet))
+        char_delta = Delta([])
+
+        for (from_state, symbol, to_state) in zip(self.delta.from_state_list,
+                                                  self.delta.symbol_list,
+                                                  self.delta.to_state_list):
+            for char in chars[symbol]:
+                char_delta.add_transition([from_state, "\\n" if char == "\n" else char,
+                                           to_state])
+
+        if char_delta.symbol_list:
+            char_delta.sort()
+
+        # the characters of the transitions are part of the alphabet when
+        # it is read back, a newline here would end the line
+        alphabet = "".join(sorted(filter(lambda x: x != "\n",
+                                         reduce(lambda x, y: x + y, chars.values(), [])))) + "\n"
         token = self.token + "\n"
         state_count = str(len(self.state_set)) + "\n"
         init_state = str(self.init_state) + "\n"
         final_states = " ".join(list(map(lambda x: str(x), self.final_states)))
 
-        return alphabet + token + init_state + str(self.delta) + final_states
+        return alphabet + token + init_state + str(char_delta) + final_states
 
     def __repr__(self):
         return str(self)
 
     def step(self, config):
+        # stepping only reads the DFA, so it can be shared between threads
         state = config[0]
         word = config[1]
 
-        next_state = self.delta.get_transitions(state, word[0])
+        next_state = self.delta.get_transitions(state, self.partition.classify(word[0]))
 
-        if state in self.sink_states and next_state is None:
+        if self.is_sink_state(state) and next_state is None:
             return state, word[1:]
-        elif state not in self.sink_states and next_state is None:
+        elif next_state is None:
             # check to see if there are any sink states and return
             # the first one in the set
             if len(self.sink_states) != 0:
                 return self.sink_states[0], word
             else:
-                # if there are no sink states, create a new one and
-                # return it
-                self.sink_states.append(State.build_from_string("-1"))
-                return State.build_from_string("-1"), word
+                # if there are no sink states, go to the dead state
+                return DEAD_STATE, word
         else:
             return next_state[0], word[1:]
 
@@ -272,7 +773,7 @@ class Dfa:
             if config is None:
                 return False
 
-        if config[0] in self.sink_states or config[0] not in self.final_states:
+        if self.is_sink_state(config[0]) or config[0] not in self.final_states:
             return False
         else:
             return True
@@ -281,10 +782,17 @@ class Dfa:
         return self.init_state
 
     def is_sink_state(self, state):
-        return state in self.sink_states
+        return state is DEAD_STATE or state in self.sink_states
 
     def is_final_state(self, state):
         return state in self.final_states
 
-    def get_token(self):
+    def get_token(self, state=None):
+        # a combined DFA recognises a different token in each final state
+        if self.state_tokens is not None and state is not None:
+            return self.state_tokens.get(state)
+
         return self.token
+
+    def get_live_rules(self, state):
+        return self.live_rules[state]
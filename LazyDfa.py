@@ -0,0 +1,194 @@
+from array import array
+
+from BitNfa import BitNfa
+
+# memory a LazyDfa may use for its states by default, in bytes
+DEFAULT_MAX_MEMORY = 4 << 20
+
+# fewest states a LazyDfa keeps: the dead and initial states, the state a
+# transition is built from and the one it leads to
+MIN_LAZY_STATES = 4
+
+
+class LazyDfa:
+    # combined DFA of a list of NFAs whose states are only built when the
+    # lexer first reaches them, like RE2 does. A state stands for a set of
+    # states of a BitNfa running the NFAs, and a transition missing from
+    # the table is computed by stepping the BitNfa in add_transition.
+    # It has the same attributes as a CompiledDfa, so the Lexer runs it
+    # directly, except that table holds -1 for the transitions not built
+    # yet and that state_count is only a bound on the state ids. Once
+    # max_states states are built, the cache is flushed: every state but
+    # the dead, the initial and the current one is forgotten and built
+    # again when it is reached, so the memory used stays under the cap.
+    # Stepping changes the automaton, it must not be shared by threads.
+    def __init__(self):
+        self.lazy = True
+
+        self.state_count = 0
+        self.class_count = 0
+        self.init_state = 1
+        self.sink_state = 0
+
+        self.partition = None
+        self.token_names = None
+
+        # the tables of CompiledDfa, grown as the states are built
+        self.table = None
+        self.accept_tokens = None
+        self.live_rules = None
+        self.accepting = None
+        self.dead = None
+
+        # largest number of states kept at once
+        self.max_states = 0
+
+        # simulation of the NFAs the states are built from
+        self.bit_nfa = None
+
+        # state set -> state id, state id -> state set, and the ids given
+        # back by the last flush
+        self.state_ids = None
+        self.state_sets = None
+        self.free_ids = None
+
+        # transitions found in the table, transitions built, and flushes
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    @staticmethod
+    def build_from_nfa_list(nfa_list, tokens, max_memory=DEFAULT_MAX_MEMORY):
+        # the NFAs are built over the same partition of the characters (see
+        # Nfa.build_from_regex) and nfa_list[i] recognises tokens[i]; the
+        # earliest one wins ties, as in Dfa.build_combined. Return None if
+        # the automaton can't fit in max_memory bytes
+        lazy = LazyDfa()
+        lazy.bit_nfa = BitNfa.build_from_nfa_list(nfa_list, tokens)
+        lazy.partition = lazy.bit_nfa.partition
+        lazy.class_count = lazy.bit_nfa.class_count
+        lazy.token_names = lazy.bit_nfa.token_names
+
+        # a state costs a row of the table, its entries in the per-state
+        # tables, its bitmask and its entry in state_ids; the states get what
+        # the BitNfa leaves of max_memory, and there is no LazyDfa if that is
+        # not enough for the fewest states it needs
+        state_size = 4 * lazy.class_count + 10 + (lazy.bit_nfa.state_count + 7) // 8 + 128
+        state_memory = max_memory - lazy.bit_nfa.get_memory_size()
+
+        if state_memory < MIN_LAZY_STATES * state_size:
+            return None
+
+        lazy.max_states = state_memory // state_size
+        lazy.state_count = lazy.max_states
+
+        lazy.table = array("i")
+        lazy.accept_tokens = array("i")
+        lazy.live_rules = array("i")
+        lazy.accepting = bytearray()
+        lazy.dead = bytearray()
+
+        lazy.state_ids = dict()
+        lazy.state_sets = []
+        lazy.free_ids = []
+
+        lazy.add_state(0)
+        lazy.add_state(lazy.bit_nfa.init_set)
+
+        return lazy
+
+    def add_state(self, state_set):
+        # give an id to a new set of NFA states and fill in its tables
+        if self.free_ids:
+            state = self.free_ids.pop()
+            self.state_sets[state] = state_set
+        else:
+            state = len(self.state_sets)
+            self.state_sets.append(state_set)
+
+            self.table.extend(array("i", [-1]) * self.class_count)
+            self.accept_tokens.append(-1)
+            self.live_rules.append(0)
+            self.accepting.append(0)
+            self.dead.append(0)
+
+        self.state_ids[state_set] = state
+
+        accept_rule = self.bit_nfa.get_accept_rule(state_set)
+        accept_token = -1 if accept_rule == -1 else self.bit_nfa.rule_tokens[accept_rule]
+        live_rules = self.bit_nfa.get_live_rules(state_set)
+
+        self.accept_tokens[state] = accept_token
+        self.live_rules[state] = live_rules
+        self.accepting[state] = accept_token != -1
+        self.dead[state] = live_rules == 0
+
+        # the dead state only leads back to itself
+        first = state * self.class_count
+        self.table[first:first + self.class_count] = \
+            array("i", [state if live_rules == 0 else -1]) * self.class_count
+
+        return state
+
+    def add_transition(self, state, symbol_class):
+        # build the transition of state on symbol_class and return the
+        # state it leads to, flushing the cache first if it is full; state
+        # keeps its id across a flush
+        to_set = self.bit_nfa.step(self.state_sets[state], symbol_class)
+        next_state = self.state_ids.get(to_set)
+
+        if next_state is None:
+            if len(self.state_ids) >= self.max_states:
+                self.flush(state)
+
+            next_state = self.state_ids.get(to_set)
+
+            if next_state is None:
+                next_state = self.add_state(to_set)
+
+        self.table[state * self.class_count + symbol_class] = next_state
+        self.misses += 1
+
+        return next_state
+
+    def flush(self, keep_state):
+        # forget every state but the dead, the initial and keep_state,
+        # along with all the transitions built so far
+        kept = {self.sink_state, self.init_state, keep_state}
+
+        self.state_ids = dict(map(lambda x: (self.state_sets[x], x), kept))
+        self.free_ids = [state for state in range(len(self.state_sets)) if state not in kept]
+
+        # the table is changed in place, the lexer holds on to it
+        self.table[:] = array("i", [-1]) * len(self.table)
+
+        first = self.sink_state * self.class_count
+        self.table[first:first + self.class_count] = \
+            array("i", [self.sink_state]) * self.class_count
+
+        self.flushes += 1
+
+    def get_stats(self):
+        return {"states": len(self.state_ids),
+                "max_states": self.max_states,
+                "hits": self.hits,
+                "misses": self.misses,
+                "flushes": self.flushes}
+
+    def get_token_name(self, token_id):
+        return self.token_names[token_id]
+
+    def step(self, state, char):
+        symbol_class = self.partition.classify(char)
+        next_state = self.table[state * self.class_count + symbol_class]
+
+        if next_state < 0:
+            next_state = self.add_transition(state, symbol_class)
+
+        return next_state
+
+    def is_dead(self, state):
+        return self.dead[state] == 1
+
+    def is_accepting(self, state):
+        return self.accepting[state] == 1
@@ -1,145 +1,741 @@
+from CompiledDfa import CompiledDfa
 from Dfa import Dfa
+from TokenBuffer import TokenBuffer, decode_lexeme
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from functools import reduce
+from multiprocessing import shared_memory
+import asyncio
+import codecs
+import mmap
+import os
+
+# words shorter than this are always tokenized sequentially by
+# Lexer.run_tokens_parallel
+MIN_PARALLEL_CHARS = 1 << 20
+
+# tokens re-lexed one at a time looking for a token a worker also found,
+# before re-lexing the rest of the chunk at once
+RESYNC_TOKENS = 64
+
+# lexer of a worker process of Lexer.run_tokens_parallel, and the shared
+# memory holding its word when the word is made of bytes
+worker_lexer = None
+worker_memory = None
+
+
+def init_worker(binary_dfa, word, memory_name=None):
+    # with memory_name, the word is the first word bytes of that shared
+    # memory, which every worker reads in place
+    global worker_lexer, worker_memory
+
+    if memory_name is not None:
+        worker_memory = shared_memory.SharedMemory(memory_name)
+        word = worker_memory.buf[:word]
+
+    worker_lexer = Lexer()
+    worker_lexer.load_from_compiled_dfa(CompiledDfa.build_from_binary(binary_dfa), word)
+
+
+def lex_chunk(chunk):
+    # tokenize a chunk of the word, assuming a token starts at its
+    # beginning; return the token columns, or None on an error
+    (start, stop) = chunk
+    tokens = worker_lexer.run_tokens(start=start, stop=stop)
+
+    if tokens.error is not None:
+        return None
+
+    return tokens.token_ids, tokens.starts, tokens.ends
 
 
 class Lexer:
     def __init__(self):
         self.dfa_list = None
         self.word = None
-        self.dfa_config_list = None
-
-    def load_initial_configurations(self):
-        self.dfa_config_list = \
-            [(i.get_init_state(), -1, i.is_sink_state(i.get_init_state())) for i in self.dfa_list]
 
-    def load_from_file(self, dfa_filepath, word_filepath):
-        def load_automatas(filepath):
-            def dfa_splitter(acc, crt):
-                if crt == '':
-                    acc.append([])
-                else:
-                    acc[-1].append(crt)
-                return acc
+        # compiled form of the automaton run() uses, which recognises the
+        # tokens of every DFA at once (see CompiledDfa)
+        self.compiled_dfa = None
 
-            with open(filepath, "r") as fd:
-                dfa_codifications = reduce(dfa_splitter, fd.read().split("\n"), [[]])
-                dfa_list = list(map(lambda x: Dfa.build_from_codification(x),
-                                    dfa_codifications))
+        # rules simulated as NFAs next to the compiled DFA, see
+        # load_from_hybrid
+        self.bit_nfa = None
 
-            return dfa_list
+        # number of characters the last run() scanned, and how many of them
+        # it scanned more than once
+        self.scanned_chars = 0
+        self.rescanned_chars = 0
 
-        def load_word(filepath):
-            with open(filepath, "r") as fd:
-                return fd.read()
+    def load_from_file(self, dfa_filepath, word_filepath, binary=False):
+        # the DFA file either holds DFAs in the text codification or a
+        # compiled DFA in the binary format (see CompiledDfa.to_binary)
+        if CompiledDfa.is_binary_file(dfa_filepath):
+            self.load_from_compiled_dfa(CompiledDfa.build_from_file(dfa_filepath),
+                                        load_word(word_filepath, binary))
+            return
 
         # load list of dfas
-        self.dfa_list = load_automatas(dfa_filepath)
-
-        # load word
-        self.word = load_word(word_filepath)
-
-        # load initial configuration for each dfa
-        self.load_initial_configurations()
+        self.load_from_dfa_list(load_automatas(dfa_filepath),
+                                load_word(word_filepath, binary))
 
     def load_from_dfa_list(self, dfa_list, word):
         self.dfa_list = dfa_list
+        self.load_from_combined_dfa(Dfa.build_combined(dfa_list), word)
+
+    def load_from_combined_dfa(self, combined_dfa, word):
+        self.load_from_compiled_dfa(CompiledDfa.build_from_dfa(combined_dfa), word)
+
+    def load_from_compiled_dfa(self, compiled_dfa, word):
+        self.compiled_dfa = compiled_dfa
+        self.bit_nfa = None
         self.word = word
-        # load initial configuration for each dfa
-        self.load_initial_configurations()
 
-    def run(self):
-        def check_if_all_rejected():
-            return reduce(lambda x, y: x and y[2], self.dfa_config_list, True)
+    def load_from_hybrid(self, compiled_dfa, bit_nfa, word):
+        # the rules of a specification are split between a compiled DFA,
+        # whose token names are the positions of its rules in the
+        # specification, and a BitNfa running the rest (see load_hybrid);
+        # every way of tokenizing uses both, as if every rule was in the
+        # DFA
+        self.load_from_compiled_dfa(compiled_dfa, word)
+        self.bit_nfa = bit_nfa
 
-        lexer_output = []
-        end_pos = 0
-        start_pos = 0
-        char_index = 0
+    def run(self, linear=False):
+        # return the (token, lexeme) pairs found in the word, or a list
+        # holding only the error message if it can't be tokenized; see
+        # run_tokens
+        return self.run_tokens(linear).to_list()
 
-        while end_pos < len(self.word):
-            for (idx, dfa) in enumerate(self.dfa_list):
-                # if the current state the dfa is in is a sink state
-                # don't bother updating its configuration
-                if self.dfa_config_list[idx][2]:
-                    continue
+    def run_tokens(self, linear=False, start=0, stop=None):
+        # tokenize the word using maximal munch and return the tokens as a
+        # TokenBuffer. Tokenizing begins at start, and only the tokens
+        # starting before stop are found, the last one possibly ending past
+        # it; by default the whole word is tokenized.
+        # Whenever a scan goes past the end of the longest token, the
+        # characters after it are scanned again for the next token, which
+        # is quadratic on inputs that keep almost matching a long token.
+        # With linear set, every (state, position) pair met after the last
+        # final state of a scan is remembered as failed, and a later scan
+        # reaching a failed pair stops right there, so no pair is ever
+        # scanned twice. rescanned_chars counts the characters that were
+        # scanned more than once.
+        # The word is either a string or a bytes-like object (see
+        # load_word); in the latter case the lexemes are memoryview slices
+        # of it, see decode_lexeme.
+        # The compiled DFA may be a LazyDfa, whose transitions are built the
+        # first time they are taken. With a BitNfa (see load_from_hybrid),
+        # every scan of the DFA is followed by one of the NFAs from the same
+        # position; the longest match wins, then the earliest rule, and the
+        # statistics only count the characters the DFA scanned.
+        #
+        # keep everything the main loop touches in local variables
+        compiled = self.compiled_dfa
+        table = compiled.table
+        class_count = compiled.class_count
+        state_count = compiled.state_count
+        classify = compiled.partition.classify
+        accept_tokens = compiled.accept_tokens
+        live_rules = compiled.live_rules
+        dead = compiled.dead
+        init_state = compiled.init_state
+        token_names = compiled.token_names
+        bit_nfa = self.bit_nfa
+        word = self.word
 
-                # prepare configuration to feed to dfa
-                config = (self.dfa_config_list[idx][0], self.word[end_pos])
+        if bit_nfa is not None:
+            # the DFA recognises rule positions, the tokens are the ones of
+            # the whole specification
+            token_names = bit_nfa.token_names
+            dfa_rules = list(map(int, compiled.token_names))
+            token_ids = bit_nfa.token_ids
 
-                # get next configuration by performing step operation
-                config = dfa.step(config)
-                prev_cursor_pos = self.dfa_config_list[idx][1]
+        if isinstance(word, str):
+            char_classes = compiled.partition.char_classes
+        else:
+            # indexing the view gives byte values, which byte_classes
+            # covers entirely
+            word = memoryview(word)
+            char_classes = compiled.partition.byte_classes
 
-                if dfa.is_sink_state(config[0]):
-                    # if current state is sink state, update configuration field
-                    self.dfa_config_list[idx] = (config[0], prev_cursor_pos, True)
-                    char_index = end_pos
-                else:
-                    if dfa.is_final_state(config[0]):
-                        # if current state is final, update state and cursor position
-                        self.dfa_config_list[idx] = (config[0], end_pos, False)
-                    else:
-                        # if current state is not final, only update sate
-                        self.dfa_config_list[idx] = (config[0], prev_cursor_pos, False)
-
-            if check_if_all_rejected() or\
-                    (not check_if_all_rejected() and end_pos + 1 == len(self.word)):
-                # extract list of all positions the dfas got stuck in
-                positions = list(map(lambda x: x[1], self.dfa_config_list))
-
-                # find index of max position
-                max_idx = positions.index(max(positions))
-
-                # extract max position
-                max_pos = self.dfa_config_list[max_idx][1]
-
-                if max_pos == -1:
-                    # if the best position we found was -1 then we have a parse
-                    # error
-
-                    # compute list of newline character occurrences
-                    newline_occurrences =\
-                        [idx for (idx, char) in enumerate(self.word) if char == "\n"]
-
-                    # compute line index from occurrence list
-                    line_index = len(list(filter(lambda x: x < char_index, newline_occurrences)))
-
-                    if check_if_all_rejected():
-                        lexer_output = ["No viable alternative "
-                                        "at character {}, "
-                                        "line {}".format(char_index, line_index)]
-                    else:
-                        lexer_output = ["No viable alternative "
-                                        "at character EOF, "
-                                        "line {}".format(line_index)]
+        word_len = len(word)
+
+        if stop is None or stop > word_len:
+            stop = word_len
+
+        tokens = TokenBuffer(word, token_names)
+        add_token = tokens.add_token
+        start_pos = start
+        char_index = start
+
+        # every position before scanned_until has already been scanned
+        scanned_until = start
+        scanned_chars = 0
+        rescanned_chars = 0
+
+        # a flush of a lazy DFA hands the ids of the states it forgot to new
+        # states, so the failed pairs remembered before it mean nothing
+        flushes = 0
+        misses = 0
+
+        if compiled.lazy:
+            flushes = compiled.flushes
+            misses = compiled.misses
+
+        # maps every failed (state, position) pair, as position *
+        # state_count + state, to the last position after it where a rule
+        # rejected, or -1; the error message depends on it
+        failed_pairs = dict()
+
+        while start_pos < stop:
+            # find the longest token starting at start_pos: advance until
+            # every rule rejected or the input ended, remembering the last
+            # final state we went through
+            state = init_state
+            max_pos = -1
+            max_token = -1
+            end_pos = start_pos
+
+            # the pairs met since the last final state, with a flag telling
+            # if a rule rejected on the character leading to them
+            tail = []
+            use_failed_pairs = linear
+            stop_rejection = -1
+
+            if bit_nfa is not None:
+                # only the rejections of this scan matter when merging it
+                # with the one of the NFAs
+                last_index = char_index
+                char_index = -1
+
+            while True:
+                if not dead[state]:
+                    # the common characters are found directly in char_classes
+                    symbol_class = char_classes.get(word[end_pos])
+
+                    if symbol_class is None:
+                        symbol_class = classify(word[end_pos])
+
+                    next_state = table[state * class_count + symbol_class]
+
+                    if next_state < 0:
+                        # transition of a lazy DFA not built yet
+                        next_state = compiled.add_transition(state, symbol_class)
+
+                        if linear and compiled.flushes != flushes:
+                            flushes = compiled.flushes
+                            failed_pairs.clear()
+                            tail = []
+
+                    if live_rules[next_state] < live_rules[state]:
+                        # some rule rejected on this character
+                        char_index = end_pos
+
+                    if accept_tokens[next_state] != -1:
+                        max_pos = end_pos
+                        max_token = accept_tokens[next_state]
+
+                        if linear:
+                            tail = []
+                    elif linear and not dead[next_state]:
+                        pair = end_pos * state_count + next_state
+                        tail.append((pair, end_pos, live_rules[next_state] < live_rules[state]))
+
+                        if use_failed_pairs and pair in failed_pairs:
+                            if max_pos != -1:
+                                # nothing after this point can be accepted,
+                                # so the scan would only go on to reject
+                                stop_rejection = failed_pairs[pair]
+
+                                if stop_rejection != -1:
+                                    char_index = stop_rejection
+
+                                state = next_state
+                                break
+
+                            # the scan is going to end in an error, finish
+                            # it normally to get the exact error message
+                            use_failed_pairs = False
+
+                    state = next_state
+
+                if dead[state] or end_pos + 1 == word_len:
                     break
+
+                end_pos += 1
+
+            # the scan ended before the input did
+            rejected = dead[state]
+
+            if bit_nfa is not None:
+                (nfa_pos, nfa_rule, nfa_rejection, nfa_alive) = \
+                    bit_nfa.scan(word, start_pos, char_classes)
+
+                if max_pos != -1:
+                    max_rule = dfa_rules[max_token]
+                    max_token = token_ids[max_rule]
+
+                if nfa_pos > max_pos or (nfa_pos == max_pos != -1
+                                         and bit_nfa.rule_ids[nfa_rule] < max_rule):
+                    max_pos = nfa_pos
+                    max_token = bit_nfa.rule_tokens[nfa_rule]
+
+                char_index = max(char_index, nfa_rejection)
+
+                if char_index == -1:
+                    char_index = last_index
+
+                rejected = rejected and not nfa_alive
+
+            # every character from start_pos to end_pos was scanned, unless
+            # the scan started in a dead state
+            if not dead[init_state]:
+                scanned_chars += end_pos + 1 - start_pos
+
+            if end_pos >= scanned_until:
+                if start_pos < scanned_until:
+                    rescanned_chars += scanned_until - start_pos
+
+                if not dead[init_state]:
+                    scanned_until = end_pos + 1
+            elif not dead[init_state]:
+                rescanned_chars += end_pos + 1 - start_pos
+
+            if max_pos == -1:
+                # if no rule accepted anything since start_pos then we
+                # have a parse error
+
+                # the line is the number of newlines before char_index
+                line_index = tokens.get_line_index().get_line(char_index)
+
+                if rejected:
+                    tokens.set_error("No viable alternative "
+                                     "at character {}, "
+                                     "line {}".format(char_index, line_index))
+                else:
+                    tokens.set_error("No viable alternative "
+                                     "at character EOF, "
+                                     "line {}".format(line_index))
+                break
+
+            if linear:
+                # remember the pairs after the token as failed, along with
+                # the last position after each of them where a rule rejected
+                if dead[state] and stop_rejection == -1:
+                    last_rejection = end_pos
+                else:
+                    last_rejection = stop_rejection
+
+                for (pair, pos, rejected) in reversed(tail):
+                    failed_pairs[pair] = last_rejection
+
+                    if rejected and last_rejection == -1:
+                        last_rejection = pos
+
+            add_token(max_token, start_pos, max_pos + 1)
+
+            # continue right after the token
+            start_pos = max_pos + 1
+
+        self.scanned_chars = scanned_chars
+        self.rescanned_chars = rescanned_chars
+
+        if compiled.lazy:
+            # every other step found its transition in the table
+            compiled.hits += scanned_chars - (compiled.misses - misses)
+
+        return tokens
+
+    def run_tokens_parallel(self, workers=None, chunk_count=None):
+        # run_tokens() over chunks of the word lexed speculatively by a pool
+        # of worker processes (as many as the machine has cores if workers
+        # is None). Each worker assumes that a token starts at the beginning
+        # of its chunk, which is placed right after a newline when possible.
+        # The chunks are then stitched together in order: from the end of
+        # the last token of the previous chunk, tokens are re-lexed one at
+        # a time until one starts where a token of the worker starts. Since
+        # maximal munch only depends on where a token starts, the worker's
+        # tokens are right from there on. A chunk that doesn't resync, or
+        # whose worker failed, is re-lexed. The tokens, and on an error the
+        # message, are always the same as run_tokens() gives.
+        word = self.word
+        word_len = len(word)
+
+        # a lazy DFA is built while it runs, it can't be shipped to workers,
+        # and neither are NFAs
+        if workers == 1 or word_len < MIN_PARALLEL_CHARS or self.compiled_dfa.lazy \
+                or self.bit_nfa is not None:
+            return self.run_tokens()
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if chunk_count is None:
+            chunk_count = 4 * workers
+
+        bounds = [0]
+
+        for chunk_idx in range(1, chunk_count):
+            pos = chunk_idx * word_len // chunk_count
+            next_pos = (chunk_idx + 1) * word_len // chunk_count
+
+            if isinstance(word, str):
+                newline_pos = word.find("\n", pos, next_pos)
+            else:
+                # a memoryview can't be searched, only the slice is copied
+                newline_pos = bytes(word[pos:next_pos]).find(b"\n")
+                newline_pos = -1 if newline_pos == -1 else pos + newline_pos
+
+            if newline_pos != -1:
+                pos = newline_pos + 1
+
+            if pos > bounds[-1]:
+                bounds.append(pos)
+
+        bounds.append(word_len)
+
+        # every worker gets its own copy of the DFA and only the bounds of
+        # its chunks. A string word is copied to every worker as well, but
+        # bytes, e.g. a mapped file, are copied once into shared memory
+        # that the workers read in place, so the memory used doesn't grow
+        # with the number of workers
+        memory = None
+        initargs = (self.compiled_dfa.to_binary(), word)
+
+        if not isinstance(word, str):
+            memory = shared_memory.SharedMemory(create=True, size=word_len)
+            memory.buf[:word_len] = word
+            initargs = (self.compiled_dfa.to_binary(), word_len, memory.name)
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=initargs) as executor:
+                results = list(executor.map(lex_chunk, zip(bounds[:-1], bounds[1:])))
+        finally:
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+
+        # like in run_tokens, the lexemes of bytes input are views
+        if not isinstance(word, str):
+            word = memoryview(word)
+
+        tokens = TokenBuffer(word, self.compiled_dfa.token_names)
+        pos = 0
+
+        for (stop, result) in zip(bounds[1:], results):
+            relexed = 0
+
+            while pos < stop:
+                if result is not None:
+                    (token_ids, starts, ends) = result
+                    first = bisect_left(starts, pos)
+
+                    if first < len(starts) and starts[first] == pos:
+                        # resynced with the worker
+                        tokens.add_tokens(token_ids, starts, ends, first)
+                        pos = ends[-1]
+                        break
+
+                if result is None or relexed == RESYNC_TOKENS:
+                    # re-lex the rest of the chunk
+                    chunk_tokens = self.run_tokens(start=pos, stop=stop)
                 else:
-                    lexer_output.append((self.dfa_list[max_idx].get_token(),
-                                         self.word[start_pos:max_pos + 1]))
+                    chunk_tokens = self.run_tokens(start=pos, stop=pos + 1)
+                    relexed += 1
+
+                if chunk_tokens.error is not None:
+                    # the message depends on everything lexed before, so
+                    # it comes from a sequential run
+                    return self.run_tokens()
+
+                tokens.add_tokens(chunk_tokens.token_ids, chunk_tokens.starts,
+                                  chunk_tokens.ends)
+                pos = chunk_tokens.ends[-1]
+
+        return tokens
+
+    def tokenize_stream(self, fileobj, chunk_size=1 << 16):
+        # generator version of run() reading the word from fileobj, chunk_size
+        # characters at a time. Only the text from the start of the token
+        # being scanned onwards is buffered, so the memory used depends on
+        # the longest scan rather than on the size of the input, and every
+        # (token, lexeme) pair is yielded as soon as it is decided. On a
+        # parse error the error message run() would return is yielded,
+        # after the tokens found before it.
+        scanner = self.scan_stream()
+        chunk = None
+
+        while True:
+            try:
+                item = scanner.send(chunk)
+            except StopIteration:
+                return
+
+            if item is None:
+                chunk = fileobj.read(chunk_size)
+            else:
+                chunk = None
+                yield item
+
+    async def atokenize(self, reader, chunk_size=1 << 16, pause_every=1 << 16,
+                        encoding="utf-8"):
+        # asynchronous version of tokenize_stream, reading the bytes of the
+        # word from an asyncio.StreamReader and decoding them with encoding.
+        # Control goes back to the event loop at least every pause_every
+        # characters tokenized, so a long input doesn't hold up the other
+        # tasks even when its data is already buffered
+        decoder = codecs.getincrementaldecoder(encoding)()
+        scanner = self.scan_stream()
+        chunk = None
+        tokenized_chars = 0
+
+        while True:
+            try:
+                item = scanner.send(chunk)
+            except StopIteration:
+                return
 
-                # update cursors
-                start_pos = max_pos + 1
-                end_pos = max_pos + 1
+            if item is None:
+                chunk = ""
 
-                # reset to initial configuration
-                self.load_initial_configurations()
+                # the bytes read can end in the middle of a character, an
+                # empty chunk has to mean the end of the input
+                while not chunk:
+                    data = await reader.read(chunk_size)
+                    chunk = decoder.decode(data, final=not data)
+
+                    if not data:
+                        break
             else:
+                chunk = None
+
+                if isinstance(item, tuple):
+                    tokenized_chars += len(item[1])
+
+                    if tokenized_chars >= pause_every:
+                        tokenized_chars = 0
+                        await asyncio.sleep(0)
+
+                yield item
+
+    def scan_stream(self):
+        # the scanner behind tokenize_stream and atokenize, which doesn't
+        # read the input itself: it yields None whenever it needs more of
+        # it and must then be sent the next chunk of the word, or an empty
+        # string at the end of the input. Otherwise it yields the tokens
+        # and the error message, as tokenize_stream does.
+        # With a BitNfa (see load_from_hybrid), the NFAs are stepped on
+        # every character along with the DFA, and the matches are merged as
+        # in run_tokens.
+        compiled = self.compiled_dfa
+        table = compiled.table
+        class_count = compiled.class_count
+        char_classes = compiled.partition.char_classes
+        classify = compiled.partition.classify
+        accept_tokens = compiled.accept_tokens
+        live_rules = compiled.live_rules
+        dead = compiled.dead
+        init_state = compiled.init_state
+        token_names = compiled.token_names
+        lazy = compiled.lazy
+        bit_nfa = self.bit_nfa
+
+        if bit_nfa is not None:
+            token_names = bit_nfa.token_names
+            dfa_rules = list(map(int, compiled.token_names))
+            token_ids = bit_nfa.token_ids
+
+        # positions are absolute, buffer[0] is the character at offset
+        buffer = ""
+        offset = 0
+        eof = False
+
+        # newlines before offset, and before char_index once the buffer no
+        # longer holds the characters up to it
+        offset_lines = 0
+        char_index_lines = 0
+
+        start_pos = 0
+        char_index = 0
+
+        def add_chunk(chunk):
+            # drop the characters before start_pos and append the next
+            # chunk; return False if the input has ended
+            nonlocal buffer, offset, eof, offset_lines, char_index_lines
+
+            if not chunk:
+                eof = True
+                return False
+
+            dropped = start_pos - offset
+
+            if offset <= char_index < start_pos:
+                char_index_lines = offset_lines + buffer.count("\n", 0, char_index - offset)
+
+            offset_lines += buffer.count("\n", 0, dropped)
+            buffer = buffer[dropped:] + chunk
+            offset = start_pos
+
+            return True
+
+        while True:
+            if start_pos == offset + len(buffer):
+                # every character read so far is in a token
+                if eof or not add_chunk((yield None)):
+                    return
+
+            state = init_state
+            max_pos = -1
+            max_token = -1
+            end_pos = start_pos
+
+            # state set of the NFAs, the number of them alive and their
+            # longest match
+            nfa_set = 0
+            nfa_live = 0
+            nfa_pos = -1
+            nfa_rule = -1
+
+            if bit_nfa is not None:
+                nfa_set = bit_nfa.init_set
+                nfa_live = bit_nfa.get_live_rules(nfa_set)
+
+            while True:
+                if not dead[state]:
+                    char = buffer[end_pos - offset]
+                    symbol_class = char_classes.get(char)
+
+                    if symbol_class is None:
+                        symbol_class = classify(char)
+
+                    next_state = table[state * class_count + symbol_class]
+
+                    if next_state < 0:
+                        # transition of a lazy DFA not built yet
+                        next_state = compiled.add_transition(state, symbol_class)
+                    elif lazy:
+                        compiled.hits += 1
+
+                    if live_rules[next_state] < live_rules[state]:
+                        # some rule rejected on this character
+                        char_index = end_pos
+
+                    state = next_state
+
+                    if accept_tokens[state] != -1:
+                        max_pos = end_pos
+                        max_token = accept_tokens[state]
+
+                if nfa_live:
+                    symbol_class = classify(buffer[end_pos - offset])
+                    nfa_set = bit_nfa.step(nfa_set, symbol_class)
+                    live = bit_nfa.get_live_rules(nfa_set)
+
+                    if live < nfa_live:
+                        # some NFA rejected on this character
+                        char_index = end_pos
+
+                    nfa_live = live
+                    accept_rule = bit_nfa.get_accept_rule(nfa_set)
+
+                    if accept_rule != -1:
+                        nfa_pos = end_pos
+                        nfa_rule = accept_rule
+
+                if dead[state] and not nfa_live:
+                    break
+
+                # the scan goes on while there is input left
+                if end_pos + 1 == offset + len(buffer):
+                    if eof or not add_chunk((yield None)):
+                        break
+
                 end_pos += 1
 
-        return lexer_output
+            if bit_nfa is not None:
+                # the longest match wins, then the earliest rule
+                if max_pos != -1:
+                    max_rule = dfa_rules[max_token]
+                    max_token = token_ids[max_rule]
+
+                if nfa_pos > max_pos or (nfa_pos == max_pos != -1
+                                         and bit_nfa.rule_ids[nfa_rule] < max_rule):
+                    max_pos = nfa_pos
+                    max_token = bit_nfa.rule_tokens[nfa_rule]
+
+            if max_pos == -1:
+                # parse error, count the newlines before char_index
+                if char_index >= offset:
+                    line_index = offset_lines + buffer.count("\n", 0, char_index - offset)
+                else:
+                    line_index = char_index_lines
+
+                if dead[state] and not nfa_live:
+                    yield "No viable alternative " \
+                          "at character {}, " \
+                          "line {}".format(char_index, line_index)
+                else:
+                    yield "No viable alternative " \
+                          "at character EOF, " \
+                          "line {}".format(line_index)
+                return
+
+            yield token_names[max_token], buffer[start_pos - offset:max_pos + 1 - offset]
+
+            # continue right after the token
+            start_pos = max_pos + 1
 
 
-def runlexer(dfa_filepath, in_filepath, out_filepath):
+def load_automatas(filepath):
+    # load the DFAs of a file in the text codification, separated by empty
+    # lines
+    def dfa_splitter(acc, crt):
+        if crt == '':
+            acc.append([])
+        else:
+            acc[-1].append(crt)
+        return acc
+
+    with open(filepath, "r") as fd:
+        dfa_codifications = reduce(dfa_splitter, fd.read().split("\n"), [[]])
+        dfa_list = list(map(lambda x: Dfa.build_from_codification(x),
+                            dfa_codifications))
+
+    return dfa_list
+
+
+def load_word(filepath, binary=False):
+    # read the whole file as a string or, with binary set, map it in
+    # memory and return a read-only view of its bytes, which the lexer
+    # reads directly without decoding or copying the file
+    if not binary:
+        with open(filepath, "r") as fd:
+            return fd.read()
+
+    with open(filepath, "rb") as fd:
+        # an empty file can't be mapped
+        if os.fstat(fd.fileno()).st_size == 0:
+            return memoryview(b"")
+
+        # the mapping stays valid after the file is closed and is released
+        # along with the last view of it
+        return memoryview(mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def runlexer(dfa_filepath, in_filepath, out_filepath, binary=False):
     lex = Lexer()
-    lex.load_from_file(dfa_filepath, in_filepath)
+    lex.load_from_file(dfa_filepath, in_filepath, binary)
     with open(out_filepath, "w") as fd:
-        lexer_output = lex.run()
+        write_tokens(fd, lex.run_tokens())
 
-        if not isinstance(lexer_output[0], tuple):
-            fd.write(lexer_output[0])
-        else:
-            for i in lexer_output:
-                token = i[0]
-                lexeme = i[1].replace("\n", "\\n")
 
-                fd.write(token + " " + lexeme + "\n")
+def write_tokens(fd, tokens):
+    # write the error message or a "token lexeme" line per token, with the
+    # newlines in the lexemes escaped
+    if tokens.error is not None:
+        fd.write(tokens.error)
+    else:
+        for i in range(tokens.get_token_count()):
+            lexeme = decode_lexeme(tokens.lexeme(i)).replace("\n", "\\n")
+
+            fd.write(tokens.get_token(i) + " " + lexeme + "\n")
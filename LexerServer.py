@@ -0,0 +1,282 @@
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from CompleteLexer import *
+
+# every message is a JSON object encoded in UTF-8 and preceded by its
+# length, as a 4 byte big-endian unsigned integer
+MESSAGE_HEADER = struct.Struct(">I")
+
+
+def send_message(sock, message):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def receive_exactly(sock, size):
+    # return size bytes read from the socket, or None if it was closed
+    # before that many bytes arrived
+    chunks = []
+
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 16))
+
+        if not chunk:
+            return None
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+def receive_message(sock):
+    # return the next message, or None if the connection was closed
+    header = receive_exactly(sock, MESSAGE_HEADER.size)
+
+    if header is None:
+        return None
+
+    data = receive_exactly(sock, MESSAGE_HEADER.unpack(header)[0])
+
+    if data is None:
+        return None
+
+    return json.loads(data.decode("utf-8"))
+
+
+class LexerServer:
+    # server keeping compiled specifications in memory and answering
+    # requests over a Unix domain socket. A request is an object with:
+    #   mode: "lex", "parse" or "interpret" (see process_word), or "stats"
+    #   spec: specification file, imp.spec by default
+    #   input: the word to process, or
+    #   path: a file holding it, read as bytes if binary is true
+    # and the response has ok, and then either result or error, along with
+    # the latency of the request in seconds. A connection can carry any
+    # number of requests; every connection has a thread reading them, and
+    # the requests are handled by a pool of at most workers threads, so an
+    # idle client doesn't hold a worker.
+    def __init__(self, socket_path, workers=4, cache=None):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.cache = cache
+
+        # specification file -> (modification time, compiled DFA), and the
+        # lock held while compiling each specification; self.lock guards
+        # the dicts and the statistics, it is never held while compiling
+        self.compiled_dfas = dict()
+        self.spec_locks = dict()
+        self.lock = threading.Lock()
+
+        self.request_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        self.server_socket = None
+        self.running = False
+
+        # pool handling the requests, and the sockets of the clients
+        # connected, shut down by close()
+        self.executor = None
+        self.connections = set()
+
+    def get_compiled_dfa(self, lex_file):
+        # the specification is compiled again if its file changed
+        mtime = os.stat(lex_file).st_mtime
+
+        with self.lock:
+            entry = self.compiled_dfas.get(lex_file)
+
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+            spec_lock = self.spec_locks.setdefault(lex_file, threading.Lock())
+
+        # only the requests for this specification wait for it to compile,
+        # and it is compiled once even if several of them missed it
+        with spec_lock:
+            with self.lock:
+                entry = self.compiled_dfas.get(lex_file)
+
+            if entry is None or entry[0] != mtime:
+                entry = (mtime, load_compiled_dfa(lex_file, minimize=True, cache=self.cache))
+
+                with self.lock:
+                    self.compiled_dfas[lex_file] = entry
+
+        return entry[1]
+
+    def get_stats(self):
+        with self.lock:
+            return {"requests": self.request_count,
+                    "mean_latency": self.total_latency / self.request_count
+                    if self.request_count else 0.0,
+                    "max_latency": self.max_latency,
+                    "specs": sorted(self.compiled_dfas)}
+
+    def handle_request(self, request):
+        mode = request.get("mode")
+
+        if mode == "stats":
+            return {"ok": True, "result": self.get_stats()}
+
+        if mode not in ("lex", "parse", "interpret"):
+            return {"ok": False, "error": "unknown mode {}".format(mode)}
+
+        if "input" in request:
+            word = request["input"]
+        elif "path" in request:
+            word = load_word(request["path"], request.get("binary", False))
+        else:
+            return {"ok": False, "error": "no input"}
+
+        dfa = self.get_compiled_dfa(request.get("spec", "imp.spec"))
+
+        return {"ok": True, "result": process_word(dfa, word, mode)}
+
+    def handle_connection(self, sock):
+        # read the requests of a client, each of them being handled in the
+        # pool while this thread waits for its response
+        with sock:
+            while True:
+                try:
+                    request = receive_message(sock)
+                except (OSError, ValueError):
+                    break
+
+                if request is None:
+                    break
+
+                start_time = time.perf_counter()
+
+                try:
+                    response = self.executor.submit(self.handle_request, request).result()
+                except RuntimeError:
+                    # the pool was shut down, the server is closing
+                    break
+                except Exception as error:
+                    response = {"ok": False, "error": "{}: {}".format(type(error).__name__, error)}
+
+                latency = time.perf_counter() - start_time
+                response["latency"] = latency
+
+                with self.lock:
+                    self.request_count += 1
+                    self.total_latency += latency
+                    self.max_latency = max(self.max_latency, latency)
+
+                try:
+                    send_message(sock, response)
+                except OSError:
+                    break
+
+        with self.lock:
+            self.connections.discard(sock)
+
+    def shutdown_connections(self):
+        # wake up the threads waiting for requests of the connected clients;
+        # only reading is shut down, so a response being prepared can still
+        # be sent
+        with self.lock:
+            connections = list(self.connections)
+
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def serve_forever(self, ready=None):
+        # serve until close() is called; ready, if given, is a
+        # threading.Event set once the socket accepts connections
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(self.socket_path)
+        self.server_socket.listen()
+
+        # wake up regularly to notice close()
+        self.server_socket.settimeout(0.2)
+        self.running = True
+
+        if ready is not None:
+            ready.set()
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        threads = []
+
+        while self.running:
+            try:
+                (sock, address) = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            sock.settimeout(None)
+
+            with self.lock:
+                self.connections.add(sock)
+
+            thread = threading.Thread(target=self.handle_connection, args=(sock,), daemon=True)
+            thread.start()
+
+            threads = list(filter(lambda x: x.is_alive(), threads)) + [thread]
+
+        self.server_socket.close()
+
+        # the clients still connected are disconnected, after the requests
+        # being handled are answered
+        self.shutdown_connections()
+
+        for thread in threads:
+            thread.join()
+
+        self.executor.shutdown()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def close(self):
+        self.running = False
+        self.shutdown_connections()
+
+
+class LexerClient:
+    # connection to a LexerServer, see LexerServer for the requests
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+
+    def request(self, mode, word=None, path=None, spec=None, binary=False):
+        request = {"mode": mode}
+
+        if word is not None:
+            request["input"] = word
+
+        if path is not None:
+            request["path"] = path
+            request["binary"] = binary
+
+        if spec is not None:
+            request["spec"] = spec
+
+        send_message(self.sock, request)
+
+        return receive_message(self.sock)
+
+    def close(self):
+        self.sock.close()
+
+
+# usage: LexerServer.py socket_path [workers]
+if __name__ == "__main__":
+    LexerServer(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 4).serve_forever()
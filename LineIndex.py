@@ -0,0 +1,52 @@
+from array import array
+from bisect import bisect_right
+import re
+
+
+class LineIndex:
+    # offsets at which the lines of a word start, used to turn a position
+    # in the word into a (line, column) pair; both are counted from 0, as in
+    # the lexer's error messages
+    def __init__(self):
+        self.line_starts = array("I", [0])
+
+    @staticmethod
+    def build_from_word(word):
+        # word is a string or a bytes-like object (see Lexer.load_word); the
+        # newlines are found in a single scan of it
+        line_index = LineIndex()
+
+        newline = "\n" if isinstance(word, str) else b"\n"
+        line_index.line_starts.extend(map(lambda x: x.end(), re.finditer(newline, word)))
+
+        return line_index
+
+    def get_line_count(self):
+        return len(self.line_starts)
+
+    def get_line_start(self, line):
+        return self.line_starts[line]
+
+    def get_line(self, pos):
+        # the line of pos is also the number of newlines before it
+        return bisect_right(self.line_starts, pos) - 1
+
+    def get_position(self, pos):
+        line = self.get_line(pos)
+
+        return line, pos - self.line_starts[line]
+
+    def get_lines(self, positions):
+        # line of every position, given in increasing order, found by
+        # walking the line starts along with them
+        lines = array("I")
+        line = 0
+        last_line = len(self.line_starts) - 1
+
+        for pos in positions:
+            while line < last_line and self.line_starts[line + 1] <= pos:
+                line += 1
+
+            lines.append(line)
+
+        return lines
@@ -1,5 +1,6 @@
 from functools import reduce
 
+from Alphabet import *
 from Delta import *
 from Regex import *
 
@@ -39,6 +40,10 @@ class Nfa:
 
         self.state_set = build_state_set()
 
+        # the same states as a set, to tell quickly whether a state is in
+        # state_set
+        self.state_lookup = set(self.state_set)
+
         # build delta function
         def build_delta():
             # transform every transition into a list
@@ -48,6 +53,14 @@ class Nfa:
 
         self.delta = build_delta()
 
+        # eps-closures are computed on demand and cached until the
+        # automaton is modified
+        self.eps_closure_cache = None
+
+        # partition of the characters whose classes are used as symbols by
+        # NFAs built from a regex, see AlphabetPartition
+        self.partition = None
+
     def get_delta(self):
         return self.delta
 
@@ -63,6 +76,7 @@ class Nfa:
 
     def add_transition(self, transition):
         self.delta.add_transition(transition)
+        self.eps_closure_cache = None
 
     def add_final_state(self, final_state):
         self.final_states.append(final_state)
@@ -71,9 +85,12 @@ class Nfa:
         return self.final_states
 
     def add_to_state_set(self, state_list):
+        self.eps_closure_cache = None
+
         for state in state_list:
-            if state not in self.state_set:
+            if state not in self.state_lookup:
                 self.state_set.append(state)
+                self.state_lookup.add(state)
 
     def get_state_set(self):
         return self.state_set
@@ -200,24 +217,198 @@ class Nfa:
         self.final_states = list(set(self.final_states).union(set(other.final_states)))
 
         # merge the state sets
-        self.state_set = list(set(self.state_set).union(set(other.state_set)))
+        self.add_to_state_set(other.state_set)
 
         # merge the deltas
         self.delta = self.delta + other.delta
 
+        self.eps_closure_cache = None
+
         return self
 
+    def compute_eps_closures(self):
+        # every state gets a bit position given by its place in the state
+        # set, and a closure is stored as an int bitmask over those bits
+        state_values = list(map(lambda x: x.components[0], self.state_set))
+        state_bits = dict()
+
+        for (bit, value) in enumerate(state_values):
+            state_bits[value] = bit
+
+        # adjacency lists of the eps-transition graph, by bit position
+        eps_graph = []
+
+        for state in self.state_set:
+            to_states = self.delta.get_transitions(state, "eps")
+
+            if to_states is None:
+                eps_graph.append([])
+            else:
+                eps_graph.append(list(map(lambda x: state_bits[x.components[0]], to_states)))
+
+        # the closures are computed in a single pass by running an iterative
+        # version of Tarjan's algorithm on the eps-graph; strongly connected
+        # components are completed in reverse topological order, so when a
+        # component is popped the closures of every component it can reach
+        # are already known and its own closure is just their union
+        state_count = len(state_values)
+        visit_index = [-1] * state_count
+        low_link = [0] * state_count
+        on_stack = [False] * state_count
+        component_mask = [-1] * state_count
+        scc_stack = []
+        counter = 0
+
+        for root in range(state_count):
+            if visit_index[root] != -1:
+                continue
+
+            visit_index[root] = low_link[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack[root] = True
+
+            # explicit DFS stack of (node, index of next neighbour to visit)
+            work_stack = [(root, 0)]
+
+            while work_stack:
+                (node, neigh_idx) = work_stack[-1]
+
+                if neigh_idx < len(eps_graph[node]):
+                    work_stack[-1] = (node, neigh_idx + 1)
+                    neigh = eps_graph[node][neigh_idx]
+
+                    if visit_index[neigh] == -1:
+                        # descend into an unvisited neighbour
+                        visit_index[neigh] = low_link[neigh] = counter
+                        counter += 1
+                        scc_stack.append(neigh)
+                        on_stack[neigh] = True
+                        work_stack.append((neigh, 0))
+                    elif on_stack[neigh]:
+                        low_link[node] = min(low_link[node], visit_index[neigh])
+
+                    continue
+
+                # all neighbours of node have been visited
+                work_stack.pop()
+
+                if work_stack:
+                    parent = work_stack[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+
+                if low_link[node] != visit_index[node]:
+                    continue
+
+                # node is the root of a component, pop all of its members
+                members = []
+                mask = 0
+
+                while True:
+                    member = scc_stack.pop()
+                    on_stack[member] = False
+                    members.append(member)
+                    mask |= 1 << member
+
+                    if member == node:
+                        break
+
+                # add the closures of the components reachable from this one;
+                # members of the current component don't have a mask yet
+                for member in members:
+                    for neigh in eps_graph[member]:
+                        if component_mask[neigh] != -1:
+                            mask |= component_mask[neigh]
+
+                for member in members:
+                    component_mask[member] = mask
+
+        # the masks are only expanded into sets of states when asked for,
+        # see get_eps_closures; BitNfa only needs the masks
+        self.eps_closure_cache = (state_bits, component_mask, None)
+
+    def get_eps_closures(self):
+        # return a dictionary mapping each state's value to the frozenset
+        # of state values reachable from it using eps-transitions
+        if self.eps_closure_cache is None:
+            self.compute_eps_closures()
+
+        (state_bits, component_mask, closures) = self.eps_closure_cache
+
+        if closures is not None:
+            return closures
+
+        # expand the masks into sets of state values; states sharing a
+        # component share the same frozenset
+        state_values = list(map(lambda x: x.components[0], self.state_set))
+        closures = dict()
+        expanded = dict()
+
+        for (bit, value) in enumerate(state_values):
+            mask = component_mask[bit]
+            closure = expanded.get(mask)
+
+            if closure is None:
+                members = []
+                remaining = mask
+
+                while remaining:
+                    lowest = remaining & -remaining
+                    members.append(state_values[lowest.bit_length() - 1])
+                    remaining ^= lowest
+
+                closure = frozenset(members)
+                expanded[mask] = closure
+
+            closures[value] = closure
+
+        self.eps_closure_cache = (state_bits, component_mask, closures)
+
+        return closures
+
+    def get_eps_closure_masks(self):
+        # return the same closures as (state_bits, masks): state_bits maps a
+        # state's value to its bit position and masks[bit] is the closure of
+        # that state as an int bitmask
+        if self.eps_closure_cache is None:
+            self.compute_eps_closures()
+
+        return self.eps_closure_cache[0], self.eps_closure_cache[1]
+
+    @staticmethod
+    def build_from_symbols(init_state, final_state, symbols):
+        # build an NFA going from init_state to final_state on any of the
+        # given symbols, using one transition per symbol
+        nfa = Nfa(["", "NFA", str(init_state), str(final_state)])
+        nfa.alphabet = list(symbols)
+
+        nfa.add_to_state_set([State.build_from_int(init_state), State.build_from_int(final_state)])
+
+        for symbol in symbols:
+            nfa.add_transition([State.build_from_int(init_state), symbol,
+                                State.build_from_int(final_state)])
+
+        return nfa
+
     @staticmethod
-    def build_from_regex(regex):
+    def build_from_regex(regex, partition=None):
+        # the symbols of the NFA are the classes of partition; if none is
+        # given, the partition of the character sets used by regex is used
+        if partition is None:
+            partition = AlphabetPartition.build_from_regex_list([regex])
+
         # prepare a list with a single element used to keep track
         # of the max state value in order to avoid state collision
         max_state = [-1]
 
-        return Nfa.build_from_regex_helper(max_state, regex)
+        nfa = Nfa.build_from_regex_helper(max_state, regex, partition)
+        nfa.partition = partition
+
+        return nfa
 
     @staticmethod
-    def build_from_regex_helper(max_state, regex):
-        if isinstance(regex, Var):
+    def build_from_regex_helper(max_state, regex, partition):
+        if isinstance(regex, Var) or isinstance(regex, CharClass):
             # compute new initial and final states
             init_state = max_state[0] + 1
             final_state = max_state[0] + 2
@@ -225,23 +416,28 @@ class Nfa:
             # update the value of the max state
             max_state[0] = max_state[0] + 2
 
-            return Nfa([regex.get_symbol(),
-                        "NFA",
-                        str(init_state),
-                        str(init_state) + ",'" + regex.get_symbol() + "'," + str(final_state),
-                        str(final_state)])
+            # a character or a whole character class is a single transition
+            # per class of the partition it covers
+            if isinstance(regex, Var):
+                symbols = [partition.classify(regex.get_symbol())]
+            else:
+                symbols = partition.get_classes(regex.get_ranges())
+
+            return Nfa.build_from_symbols(init_state, final_state, symbols)
         elif isinstance(regex, Star):
-            return Nfa.build_from_regex_helper(max_state, regex.get_regex()).star(max_state)
+            return Nfa.build_from_regex_helper(max_state, regex.get_regex(), partition)\
+                .star(max_state)
         elif isinstance(regex, Plus):
-            return Nfa.build_from_regex_helper(max_state, regex.get_regex()).plus(max_state)
+            return Nfa.build_from_regex_helper(max_state, regex.get_regex(), partition)\
+                .plus(max_state)
         elif isinstance(regex, Concat):
-            left_nfa = Nfa.build_from_regex_helper(max_state, regex.get_left_regex())
-            right_nfa = Nfa.build_from_regex_helper(max_state, regex.get_right_regex())
+            left_nfa = Nfa.build_from_regex_helper(max_state, regex.get_left_regex(), partition)
+            right_nfa = Nfa.build_from_regex_helper(max_state, regex.get_right_regex(), partition)
 
             return left_nfa.concat(right_nfa)
         elif isinstance(regex, Union):
-            left_nfa = Nfa.build_from_regex_helper(max_state, regex.get_left_regex())
-            right_nfa = Nfa.build_from_regex_helper(max_state, regex.get_right_regex())
+            left_nfa = Nfa.build_from_regex_helper(max_state, regex.get_left_regex(), partition)
+            right_nfa = Nfa.build_from_regex_helper(max_state, regex.get_right_regex(), partition)
 
             return left_nfa.union(right_nfa, max_state)
 
@@ -18,6 +18,8 @@ class Regex:
                 stack.append(Star(None))
             elif token == "PLUS":
                 stack.append(Plus(None))
+            elif CharClass.is_class_token(token):
+                stack.append(CharClass.build_from_string(token))
             else:
                 stack.append(Var(token))
 
@@ -63,6 +65,8 @@ class Regex:
                 stack.append(Star(None))
             elif token == "PLUS":
                 stack.append(Plus(None))
+            elif CharClass.is_class_token(token):
+                stack.append(CharClass.build_from_string(token))
             else:
                 stack.append(Var(token))
 
@@ -93,17 +97,35 @@ class Regex:
 
     @staticmethod
     def tokenize(regex: str):
-        # string that will replace the [a-z] alias
-        expand_a_z = "(a|b|c|d|e|f|g|h|i|j|k|l|m|n|o|p|q|r|s|t|u|v|w|x|y|z)"
-
-        # string that will replace the [0-9] alias
-        expand_0_9 = "(0|1|2|3|4|5|6|7|8|9)"
+        # character classes such as [a-z] may contain operators, so they are
+        # taken out before anything else is replaced: each one is swapped
+        # for a CLASS<n> placeholder operand and put back at the end
+        class_list = []
+        stripped = []
+        i = 0
 
-        # expand [a-z]
-        regex = regex.replace("[a-z]", expand_a_z)
+        while i < len(regex):
+            if regex[i] == "'" and i + 2 < len(regex) and regex[i + 2] == "'":
+                # quoted normal character
+                stripped.append(regex[i:i + 3])
+                i += 3
+            elif regex[i] == "'" and i + 3 < len(regex) and regex[i + 1] == "\\" \
+                    and regex[i + 3] == "'":
+                # quoted control character
+                stripped.append(regex[i:i + 4])
+                i += 4
+            elif regex[i] == "[" and CharClass.find_end(regex, i) != -1:
+                end = CharClass.find_end(regex, i)
+
+                stripped.append(" CLASS{} ".format(len(class_list)))
+                class_list.append(regex[i:end + 1])
+                i = end + 1
+            else:
+                stripped.append(regex[i])
+                i += 1
 
-        # expand [0-9]
-        regex = regex.replace("[0-9]", expand_0_9)
+        regex = "".join(stripped)
+        placeholders = list(map(lambda x: "CLASS{}".format(x), range(len(class_list))))
 
         # add spaces between the parentheses and the following tokens
         regex = regex.replace("'('", "PAR").replace("(", " ( ").replace("PAR", "'('")
@@ -127,9 +149,9 @@ class Regex:
 
         # add the concatenation operator between symbols that are not operators in a token
         def concat_adder(string):
-            if string in specials:
-                # if the string is a special character (not an operand) then
-                # do not modify it
+            if string in specials or string in placeholders:
+                # if the string is a special character (not an operand) or a
+                # character class then do not modify it
                 return [string]
             else:
                 result = []
@@ -195,6 +217,10 @@ class Regex:
             else:
                 i += 1
 
+        # put the character classes back
+        tokens = list(map(lambda x: class_list[placeholders.index(x)] if x in placeholders else x,
+                          tokens))
+
         return tokens
 
     @staticmethod
@@ -403,3 +429,147 @@ class Concat(Regex):
 
     def get_right_regex(self):
         return self.r_regex
+
+
+class CharClass(Regex):
+    # a set of characters given as a bracket expression: single characters
+    # and first-last ranges, optionally negated with a leading ^, e.g.
+    # [a-z], [a-zA-Z_0-9] or [^'\n]. Inside the brackets \n and \t stand
+    # for newline and tab and \ escapes any other character (such as ] or -)
+    def __init__(self, ranges, negated=False):
+        super().__init__()
+        # list of (first, last) characters, both ends included
+        self.ranges = ranges
+        self.negated = negated
+
+    @staticmethod
+    def find_end(string, start):
+        # return the index of the ] closing the bracket expression opened at
+        # string[start], or -1 if there is none; a ] right after the [ or
+        # the [^ is taken literally
+        i = start + 1
+
+        if i < len(string) and string[i] == "^":
+            i += 1
+
+        if i < len(string) and string[i] == "]":
+            i += 1
+
+        while i < len(string):
+            if string[i] == "\\":
+                i += 2
+            elif string[i] == "]":
+                return i
+            else:
+                i += 1
+
+        return -1
+
+    @staticmethod
+    def is_class_token(token):
+        return len(token) > 2 and token[0] == "[" and CharClass.find_end(token, 0) == len(token) - 1
+
+    @staticmethod
+    def build_from_string(string):
+        # string is a whole bracket expression, brackets included
+        content = string[1:-1]
+        negated = False
+
+        if content and content[0] == "^":
+            negated = True
+            content = content[1:]
+
+        # resolve the escapes first, remembering which characters were
+        # escaped so that an escaped - is never taken as a range
+        chars = []
+        i = 0
+
+        while i < len(content):
+            if content[i] == "\\" and i + 1 < len(content):
+                if content[i + 1] == "n":
+                    chars.append(("\n", True))
+                elif content[i + 1] == "t":
+                    chars.append(("\t", True))
+                else:
+                    chars.append((content[i + 1], True))
+
+                i += 2
+            else:
+                chars.append((content[i], False))
+                i += 1
+
+        ranges = []
+        i = 0
+
+        while i < len(chars):
+            if i + 2 < len(chars) and chars[i + 1] == ("-", False):
+                ranges.append((chars[i][0], chars[i + 2][0]))
+                i += 3
+            else:
+                ranges.append((chars[i][0], chars[i][0]))
+                i += 1
+
+        return CharClass(ranges, negated)
+
+    def is_satisfied(self):
+        return True
+
+    def apply(self, regex):
+        pass
+
+    def inverse_apply(self, regex):
+        pass
+
+    def get_ranges(self):
+        # return the set of characters as sorted, disjoint (first, last)
+        # code point ranges, with the negation already applied
+        code_ranges = sorted(map(lambda x: (ord(x[0]), ord(x[1])), self.ranges))
+        merged = []
+
+        for (first, last) in code_ranges:
+            if first > last:
+                continue
+
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+
+        if not self.negated:
+            return merged
+
+        complement = []
+        next_first = 0
+
+        for (first, last) in merged:
+            if first > next_first:
+                complement.append((next_first, first - 1))
+
+            next_first = last + 1
+
+        if next_first <= 0x10FFFF:
+            complement.append((next_first, 0x10FFFF))
+
+        return complement
+
+    def __str__(self):
+        def escape(char):
+            if char == "\n":
+                return "\\n"
+            elif char == "\t":
+                return "\\t"
+            elif char in "\\]-^":
+                return "\\" + char
+            else:
+                return char
+
+        def range_str(char_range):
+            if char_range[0] == char_range[1]:
+                return escape(char_range[0])
+            else:
+                return escape(char_range[0]) + "-" + escape(char_range[1])
+
+        return "[" + ("^" if self.negated else "") + "".join(map(range_str, self.ranges)) + "]"
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+
+from CompiledDfa import CompiledDfa
+
+# version of the automata construction; entries built by another version
+# are never used, so it has to change whenever the compiled DFAs would
+COMPILER_VERSION = "1"
+
+
+class SpecCache:
+    # directory of compiled specifications, one file per entry named after
+    # the key of the entry and holding a CompiledDfa in its binary format.
+    # An entry is keyed by the hash of the specification text, the compiler
+    # version and the compile options, so changing any of them makes the
+    # old entry unreachable.
+    # When the entries take more than max_size bytes the least recently
+    # used ones are removed.
+    def __init__(self, cache_dir, max_size=64 << 20):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_key(spec, options=None):
+        digest = hashlib.sha256()
+
+        digest.update(COMPILER_VERSION.encode())
+        digest.update(b"\0")
+        digest.update(repr(sorted((options or dict()).items())).encode())
+        digest.update(b"\0")
+        digest.update(spec.encode())
+
+        return digest.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".dfa")
+
+    def load(self, key):
+        # return the compiled DFA stored under key, or None
+        path = self.get_entry_path(key)
+
+        try:
+            compiled = CompiledDfa.build_from_file(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            compiled = None
+
+        if compiled is None:
+            # an unreadable entry is dropped and built again
+            self.remove(path)
+            return None
+
+        # the modification time orders the entries by their last use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return compiled
+
+    def store(self, key, compiled):
+        # write to a temporary file next to the entry and move it in place,
+        # so that readers never see a partially written entry
+        (fd, temp_path) = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as temp_fd:
+                temp_fd.write(compiled.to_binary())
+
+            os.replace(temp_path, self.get_entry_path(key))
+        except OSError:
+            self.remove(temp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        # remove the least recently used entries until the rest fit
+        entries = []
+
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".dfa"):
+                continue
+
+            path = os.path.join(self.cache_dir, name)
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(map(lambda x: x[1], entries))
+
+        for (mtime, size, path) in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            self.remove(path)
+            total_size -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,60 +1,83 @@
+from weakref import WeakValueDictionary
+import threading
+
+# guards the intern table: looking a state up and inserting it must be a
+# single step, or two threads could each build their own instance of the
+# same state, and the two would compare unequal
+intern_lock = threading.Lock()
+
 
 class State:
-    def __init__(self):
-        self.components = []
+    # every State is immutable and interned: there is at most one live
+    # instance for each set of components, so equality is an identity check
+    # and the hash is computed only once, when the state is first built
+    __slots__ = ("components", "component_set", "hash_value", "__weakref__")
 
-    @staticmethod
-    def build_from_string(string):
-        state = State()
+    # global intern table mapping a sorted tuple of components to the
+    # unique State instance holding them
+    intern_table = WeakValueDictionary()
 
-        # the list of components will be sorted because states such as
+    def __new__(cls, components=()):
+        # the components are kept sorted because states such as
         # [1, 2, 3] and [3, 2, 1] are actually the same
-        state.components = sorted(list(map(lambda x: int(x), string.split(","))))
+        key = tuple(sorted(set(components)))
 
-        return state
+        with intern_lock:
+            state = State.intern_table.get(key)
 
-    @staticmethod
-    def build_from_int(value):
-        state = State()
+            if state is None:
+                state = object.__new__(cls)
+                state.components = key
+                state.component_set = frozenset(key)
+                state.hash_value = hash(key)
 
-        state.components = [value]
+                State.intern_table[key] = state
 
         return state
 
+    @staticmethod
+    def build_from_string(string):
+        return State(map(lambda x: int(x), string.split(",")))
+
+    @staticmethod
+    def build_from_int(value):
+        return State((value,))
+
     def get_component_states(self):
         return list(map(lambda x: State.build_from_int(x), self.components))
 
     def __contains__(self, item):
-        return isinstance(item, State) and set(item.components).issubset(self.components)
+        # for the usual case of a single component state this is a
+        # single set lookup
+        return isinstance(item, State) and item.component_set <= self.component_set
 
     def __str__(self):
-        return "".join(list(map(lambda x: str(x), self.components)))
+        # the components are separated by commas so that states such as
+        # [1, 2] and [12] have different representations
+        return ",".join(map(lambda x: str(x), self.components))
 
     def __repr__(self):
         return str(self)
 
     def __eq__(self, other):
-        if not isinstance(other, State):
-            return False
-
-        if len(self.components) != len(other.components):
-            return False
-
-        return self.components == other.components
+        # interning guarantees that equal states are the same object
+        return self is other
 
     def __hash__(self):
-        return hash(repr(self))
+        return self.hash_value
+
+    def __reduce__(self):
+        # rebuild through the constructor so that unpickled (or copied)
+        # states end up in the intern table as well
+        return State, (self.components,)
 
     def __add__(self, other):
         if isinstance(other, int):
             if len(self.components) == 1:
-                return State.build_from_string(str(self.components[0] + other))
+                return State.build_from_int(self.components[0] + other)
         elif isinstance(other, State):
-            self.components = sorted(list(set(self.components + other.components)))
-            return self
+            # states are immutable, so the union is a new state
+            return State(self.components + other.components)
 
     def __lt__(self, other):
-        if len(self.components) == 1 and len(other.components) == 1:
-            return self.components[-1].__lt__(other.components[-1])
-        else:
-            return False
+        return self.components < other.components
@@ -0,0 +1,129 @@
+from array import array
+
+from LineIndex import LineIndex
+
+
+def decode_lexeme(lexeme):
+    # lexemes of bytes input are views of the input, only turned into
+    # strings when needed; every byte stands for the latin-1 character
+    # with the same code point
+    if isinstance(lexeme, str):
+        return lexeme
+
+    return str(lexeme, "latin-1")
+
+
+class TokenBuffer:
+    # tokens found by the lexer in a word, kept as three parallel columns:
+    # the start and end offset of each lexeme in the word and the id of its
+    # token (index in token_names). Lexemes are only sliced out of the word
+    # when asked for, so a token costs 12 bytes instead of a tuple and a
+    # substring.
+    #
+    # Indexing and iterating give the same items as the list Lexer.run()
+    # returns: a (token, lexeme) tuple per token or, if the word couldn't
+    # be tokenized, only the error message.
+    def __init__(self, word, token_names):
+        self.word = word
+        self.token_names = token_names
+
+        self.starts = array("I")
+        self.ends = array("I")
+        self.token_ids = array("I")
+
+        # error message of a failed tokenization, the columns are empty
+        self.error = None
+
+        # line starts of the word and line of every token, built the first
+        # time a position is asked for
+        self.line_index = None
+        self.lines = None
+
+    def add_token(self, token_id, start, end):
+        self.token_ids.append(token_id)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def add_tokens(self, token_ids, starts, ends, first=0):
+        # append the tokens of the given columns, from index first on
+        self.token_ids.extend(token_ids[first:])
+        self.starts.extend(starts[first:])
+        self.ends.extend(ends[first:])
+
+    def set_error(self, message):
+        # like Lexer.run(), drop the tokens found before the error
+        del self.token_ids[:]
+        del self.starts[:]
+        del self.ends[:]
+
+        self.error = message
+
+    def get_token_count(self):
+        return len(self.token_ids)
+
+    def get_token_id(self, i):
+        return self.token_ids[i]
+
+    def get_token(self, i):
+        return self.token_names[self.token_ids[i]]
+
+    def get_start(self, i):
+        return self.starts[i]
+
+    def get_end(self, i):
+        return self.ends[i]
+
+    def lexeme(self, i):
+        return self.word[self.starts[i]:self.ends[i]]
+
+    def get_line_index(self):
+        if self.line_index is None:
+            self.line_index = LineIndex.build_from_word(self.word)
+
+        return self.line_index
+
+    def get_line(self, i):
+        if self.lines is None:
+            # the tokens are in order, so a single walk finds every line
+            self.lines = self.get_line_index().get_lines(self.starts)
+
+        return self.lines[i]
+
+    def get_column(self, i):
+        return self.starts[i] - self.get_line_index().get_line_start(self.get_line(i))
+
+    def get_position(self, i):
+        # (line, column) of the start of token i
+        return self.get_line(i), self.get_column(i)
+
+    def decoded(self):
+        # iterate like the buffer itself, with every lexeme as a string
+        if self.error is not None:
+            return iter([self.error])
+
+        return zip(map(self.token_names.__getitem__, self.token_ids),
+                   map(lambda x: decode_lexeme(self.word[x[0]:x[1]]),
+                       zip(self.starts, self.ends)))
+
+    def to_list(self):
+        return list(self)
+
+    def __len__(self):
+        if self.error is not None:
+            return 1
+
+        return len(self.token_ids)
+
+    def __getitem__(self, i):
+        if self.error is not None:
+            return [self.error][i]
+
+        return self.token_names[self.token_ids[i]], self.lexeme(i)
+
+    def __iter__(self):
+        if self.error is not None:
+            return iter([self.error])
+
+        # the tuples are built one at a time, as they are consumed
+        return zip(map(self.token_names.__getitem__, self.token_ids),
+                   map(self.word.__getitem__, map(slice, self.starts, self.ends)))
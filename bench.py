@@ -0,0 +1,109 @@
+from CompleteLexer import *
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# letters the synthetic keywords are written with, and the leaves of the
+# synthetic nested regexes
+BENCH_LETTERS = "abcdefghij"
+BENCH_LEAVES = ["a", "b", "c", "d", "[a-c]"]
+
+
+def make_keyword_spec(keyword_count, seed=0):
+    # a spec in the style of imp.spec, with keyword_count keywords before
+    # the identifiers, numbers and operators
+    rng = random.Random(seed)
+    keywords = set()
+
+    while len(keywords) < keyword_count:
+        keywords.add("".join(rng.choice(BENCH_LETTERS) for _ in range(rng.randint(2, 8))))
+
+    return "KEYWORDS " + " | ".join(sorted(keywords)) + ";\n" \
+        + "EXPR ([a-z]+ | -*[0-9]+)(' '*('+' | '*' | - | > | ==)' '*([a-z]+ | -*[0-9]+))*;\n" \
+        + "ASSIGN [a-z]+' '*=;\n" \
+        + "SPACES ' ' | '\\t' | '\\n';\n"
+
+
+def make_nested_spec(rule_count, depth, seed=0):
+    # rule_count rules of random nested unions, concatenations and
+    # repetitions, depth levels deep
+    rng = random.Random(seed)
+
+    def make_regex(level):
+        if level == 0:
+            return rng.choice(BENCH_LEAVES)
+
+        kind = rng.randint(0, 3)
+
+        if kind == 0:
+            return make_regex(level - 1) + make_regex(level - 1)
+        if kind == 1:
+            return "(" + make_regex(level - 1) + " | " + make_regex(level - 1) + ")"
+        if kind == 2:
+            return "(" + make_regex(level - 1) + ")*"
+
+        return "(" + make_regex(level - 1) + ")+"
+
+    return "".join(map(lambda x: "T{} {};\n".format(x, make_regex(depth)), range(rule_count)))
+
+
+def measure(lex_file, direct, repeat):
+    # best time building the DFAs of the rules over repeat runs, peak
+    # memory of one more run and the number of states of the DFAs; the
+    # combined DFA is left out, it is built the same way in both cases
+    best_time = None
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        load_dfa_list(lex_file, direct=direct)
+        elapsed = time.perf_counter() - start_time
+
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+
+    tracemalloc.start()
+    dfa_list = load_dfa_list(lex_file, direct=direct)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best_time, peak_memory, sum(map(lambda x: len(x.state_set), dfa_list))
+
+
+def run_benchmark(repeat=3):
+    # compare the Thompson NFA + subset construction path with the direct
+    # construction (see Dfa.build_from_regex) on imp.spec and synthetic
+    # specifications; neither minimizes the DFAs
+    specs = [("imp.spec", None),
+             ("keywords-50", make_keyword_spec(50)),
+             ("keywords-200", make_keyword_spec(200)),
+             ("nested-10x5", make_nested_spec(10, 5)),
+             ("nested-50x6", make_nested_spec(50, 6))]
+
+    print("{:<14} {:>12} {:>12} {:>8} {:>12} {:>12} {:>8}".format(
+        "spec", "nfa time", "direct time", "speedup", "nfa peak", "direct peak", "states"))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for (name, spec) in specs:
+            lex_file = name
+
+            if spec is not None:
+                lex_file = os.path.join(temp_dir, name + ".spec")
+
+                with open(lex_file, "w") as fd:
+                    fd.write(spec)
+
+            (nfa_time, nfa_peak, nfa_states) = measure(lex_file, False, repeat)
+            (direct_time, direct_peak, direct_states) = measure(lex_file, True, repeat)
+
+            print("{:<14} {:>11.4f}s {:>11.4f}s {:>7.2f}x {:>11.1f}K {:>11.1f}K {:>8}".format(
+                name, nfa_time, direct_time, nfa_time / direct_time,
+                nfa_peak / 1024, direct_peak / 1024,
+                "{}/{}".format(nfa_states, direct_states)))
+
+
+# usage: bench.py [repeat], e.g. python bench.py > bench_output.txt
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,159 @@
+from CompleteLexer import load_compiled_dfa
+import sys
+
+# source of a generated lexer module, completed with the tables of the
+# compiled DFA; it depends on nothing but the standard library
+MODULE_TEMPLATE = '''\
+# lexer generated by lexgen.py from {spec_name}, do not edit
+from bisect import bisect_right
+
+TOKEN_NAMES = {token_names}
+
+INIT_STATE = {init_state}
+CLASS_COUNT = {class_count}
+
+# partition of the characters into classes: the classes of the characters
+# below 256, then the first code point and the class of every interval
+LOW_CLASSES = {low_classes}
+BOUNDS = {bounds}
+INTERVAL_CLASSES = {interval_classes}
+
+CHAR_CLASSES = dict(zip(map(chr, range(256)), LOW_CLASSES))
+
+# transition table indexed by state * CLASS_COUNT + class
+TABLE = {table}
+
+# per state: id of the recognised token or -1, and the number of rules
+# still alive, 0 for dead states
+ACCEPT_TOKENS = {accept_tokens}
+LIVE_RULES = {live_rules}
+
+
+def classify(char):
+    symbol_class = CHAR_CLASSES.get(char)
+
+    if symbol_class is None:
+        symbol_class = INTERVAL_CLASSES[bisect_right(BOUNDS, ord(char)) - 1]
+
+    return symbol_class
+
+
+def run(word):
+    # tokenize word using maximal munch, the earliest rule winning ties;
+    # return the (token, lexeme) pairs or, if the word can't be tokenized,
+    # a list holding only the error message (same as Lexer.run)
+    table = TABLE
+    class_count = CLASS_COUNT
+    char_classes = CHAR_CLASSES
+    accept_tokens = ACCEPT_TOKENS
+    live_rules = LIVE_RULES
+    token_names = TOKEN_NAMES
+    word_len = len(word)
+
+    lexer_output = []
+    start_pos = 0
+    char_index = 0
+
+    while start_pos < word_len:
+        state = INIT_STATE
+        live = live_rules[state]
+        max_pos = -1
+        max_token = -1
+        end_pos = start_pos
+
+        while live:
+            symbol_class = char_classes.get(word[end_pos])
+
+            if symbol_class is None:
+                symbol_class = classify(word[end_pos])
+
+            state = table[state * class_count + symbol_class]
+
+            if live_rules[state] < live:
+                # some rule rejected on this character
+                char_index = end_pos
+
+            live = live_rules[state]
+
+            if accept_tokens[state] != -1:
+                max_pos = end_pos
+                max_token = accept_tokens[state]
+
+            if end_pos + 1 == word_len:
+                break
+
+            end_pos += 1
+
+        if max_pos == -1:
+            line_index = word.count("\\n", 0, char_index)
+
+            if not live:
+                return ["No viable alternative "
+                        "at character {{}}, "
+                        "line {{}}".format(char_index, line_index)]
+
+            return ["No viable alternative "
+                    "at character EOF, "
+                    "line {{}}".format(line_index)]
+
+        lexer_output.append((token_names[max_token], word[start_pos:max_pos + 1]))
+
+        # continue right after the token
+        start_pos = max_pos + 1
+
+    return lexer_output
+'''
+
+
+def format_values(values, indent=4, width=79):
+    # tuple literal of the given ints, wrapped to fit in width columns
+    lines = []
+    line = ""
+
+    for value in map(lambda x: str(x) + ",", values):
+        if line and indent + len(line) + 1 + len(value) > width:
+            lines.append(line)
+            line = value
+        else:
+            line = line + " " + value if line else value
+
+    if line:
+        lines.append(line)
+
+    if not lines:
+        return "()"
+
+    return "(\n" + "".join(map(lambda x: " " * indent + x + "\n", lines)) + ")"
+
+
+def generate_lexer(lex_file, minimize=True):
+    # return the source of a module tokenizing with the rules of the
+    # specification file
+    compiled = load_compiled_dfa(lex_file, minimize)
+    partition = compiled.partition
+
+    # dead states are the ones with no rule alive
+    live_rules = list(map(lambda x: 0 if compiled.dead[x] else compiled.live_rules[x],
+                          range(compiled.state_count)))
+
+    return MODULE_TEMPLATE.format(
+        spec_name=lex_file,
+        token_names=repr(tuple(compiled.token_names)),
+        init_state=compiled.init_state,
+        class_count=compiled.class_count,
+        low_classes=format_values(map(lambda x: partition.classify_code_point(x), range(256))),
+        bounds=format_values(partition.bounds),
+        interval_classes=format_values(partition.interval_classes),
+        table=format_values(compiled.table),
+        accept_tokens=format_values(compiled.accept_tokens),
+        live_rules=format_values(live_rules))
+
+
+def write_lexer(lex_file, output_file, minimize=True):
+    with open(output_file, "w") as fd:
+        fd.write(generate_lexer(lex_file, minimize))
+
+
+# usage: lexgen.py spec_file output_file
+if __name__ == "__main__":
+    write_lexer(sys.argv[1], sys.argv[2])
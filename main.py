@@ -1,16 +1,39 @@
 from Nfa import *
 from Dfa import *
+from CompiledDfa import *
 import sys
 
 
-def convert_regex_to_dfa(input_file, output_file):
+def convert_regex_to_dfa(input_file, output_file, binary=False):
+    # with binary set the DFA is written in the binary format of
+    # CompiledDfa instead of the text codification
     with open(input_file, "r") as fd:
         regex = Regex.parse(fd.read())
 
     dfa = Dfa.build_from_nfa(Nfa.build_from_regex(regex))
 
+    if binary:
+        CompiledDfa.build_from_dfa(dfa).write_binary(output_file)
+        return
+
+    # build the codification first, so that a DFA it can't hold doesn't
+    # leave an empty file behind
+    codification = str(dfa)
+
     with open(output_file, "w") as fd:
-        fd.write(str(dfa))
+        fd.write(codification)
+
+
+def convert_spec_to_dfa(lex_file, output_file):
+    # compile every rule of a specification file into a single DFA and
+    # write it in the binary format, ready to be loaded by Lexer.load_from_file
+    from CompleteLexer import load_compiled_dfa
+
+    load_compiled_dfa(lex_file, minimize=True).write_binary(output_file)
 
 
-convert_regex_to_dfa(sys.argv[1], sys.argv[2])
+# usage: main.py input output [--binary | --spec]
+if len(sys.argv) > 3 and sys.argv[3] == "--spec":
+    convert_spec_to_dfa(sys.argv[1], sys.argv[2])
+else:
+    convert_regex_to_dfa(sys.argv[1], sys.argv[2], len(sys.argv) > 3 and sys.argv[3] == "--binary")
@@ -0,0 +1,39 @@
+# random specifications and words for the tests comparing two ways of
+# lexing; rng is a random.Random, so that a failure can be replayed
+
+# leaves of the random regexes, and the characters of the random words,
+# one of which no rule matches
+SPEC_LEAVES = ["a", "b", "c", "[ab]", "[^a]"]
+WORD_CHARS = "abcd"
+
+
+def make_regex(rng, depth):
+    if depth == 0:
+        return rng.choice(SPEC_LEAVES)
+
+    kind = rng.randint(0, 4)
+
+    if kind == 0:
+        return make_regex(rng, depth - 1) + make_regex(rng, depth - 1)
+    if kind == 1:
+        return "(" + make_regex(rng, depth - 1) + " | " + make_regex(rng, depth - 1) + ")"
+    if kind == 2:
+        return "(" + make_regex(rng, depth - 1) + ")*"
+    if kind == 3:
+        return "(" + make_regex(rng, depth - 1) + ")+"
+
+    return make_regex(rng, depth - 1)
+
+
+def write_spec(path, rng, rule_count, depth=3):
+    # write a specification of rule_count random rules to path
+    with open(path, "w") as fd:
+        for rule in range(rule_count):
+            fd.write("T{} {};\n".format(rule, make_regex(rng, depth)))
+
+    return str(path)
+
+
+def make_words(rng, count, max_len=30):
+    return ["".join(rng.choice(WORD_CHARS) for _ in range(rng.randint(1, max_len)))
+            for _ in range(count)]
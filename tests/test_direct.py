@@ -0,0 +1,45 @@
+import random
+
+from CompleteLexer import load_compiled_dfa, load_dfa_list
+from Lexer import Lexer
+from random_specs import make_words, write_spec
+
+
+def test_direct_matches_subset_construction(tmp_path):
+    # both constructions recognise the same languages, so the lexers give
+    # the same tokens and errors, and the minimal DFAs have as many states
+    rng = random.Random(25)
+
+    for spec in range(40):
+        lex_file = write_spec(tmp_path / "random.spec", rng, rng.randint(1, 4),
+                              rng.choice([2, 3, 4]))
+        minimize = spec % 2 == 0
+
+        expected_dfa = load_compiled_dfa(lex_file, minimize)
+        direct_dfa = load_compiled_dfa(lex_file, minimize, direct=True)
+
+        if minimize:
+            assert direct_dfa.state_count == expected_dfa.state_count
+
+        for word in make_words(rng, 20):
+            for linear in (False, True):
+                expected = Lexer()
+                expected.load_from_compiled_dfa(expected_dfa, word)
+
+                lexer = Lexer()
+                lexer.load_from_compiled_dfa(direct_dfa, word)
+
+                assert lexer.run(linear) == expected.run(linear), (open(lex_file).read(), word)
+
+
+def test_direct_long_rule(tmp_path):
+    # the tree of a long literal is too deep to be walked recursively
+    rng = random.Random(25)
+    literal = "".join(rng.choice("abc") for _ in range(2000))
+
+    lex_file = tmp_path / "long.spec"
+    lex_file.write_text("LONG {};\n".format(literal))
+
+    (dfa,) = load_dfa_list(str(lex_file), direct=True)
+
+    assert len(dfa.state_set) == len(literal) + 2
@@ -0,0 +1,52 @@
+import os
+import random
+import types
+
+from CompleteLexer import load_compiled_dfa
+from Lexer import Lexer
+from lexgen import generate_lexer
+from random_specs import make_words, write_spec
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_generated(lex_file, minimize=True):
+    # the generated lexer, imported from its source
+    module = types.ModuleType("generated_lexer")
+    exec(compile(generate_lexer(lex_file, minimize), "generated_lexer", "exec"), module.__dict__)
+
+    return module
+
+
+def run_lexer(lex_file, word, minimize=True):
+    lexer = Lexer()
+    lexer.load_from_compiled_dfa(load_compiled_dfa(lex_file, minimize), word)
+
+    return lexer.run()
+
+
+def test_generated_matches_lexer(tmp_path):
+    rng = random.Random(22)
+
+    for spec in range(40):
+        lex_file = write_spec(tmp_path / "random.spec", rng, rng.randint(1, 5))
+        minimize = spec % 2 == 0
+        generated = load_generated(lex_file, minimize)
+        compiled = load_compiled_dfa(lex_file, minimize)
+
+        for word in make_words(rng, 20):
+            lexer = Lexer()
+            lexer.load_from_compiled_dfa(compiled, word)
+
+            assert generated.run(word) == lexer.run(), (open(lex_file).read(), word)
+
+
+def test_generated_imp_lexer():
+    # the words end normally, on a character past the first 256 (classified
+    # through the intervals), on a character no rule matches and at EOF
+    lex_file = os.path.join(ROOT_DIR, "imp.spec")
+    generated = load_generated(lex_file)
+
+    for word in ("begin\n  x = 1 + 2\n  while (x > 0) do\n    x = x - 1\n  od\nend\n",
+                 "begin\n  x = 1\nend\n€", "begin\n  x = #\nend\n", "begin\n  x"):
+        assert generated.run(word) == run_lexer(lex_file, word)
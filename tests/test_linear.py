@@ -0,0 +1,45 @@
+import random
+
+from CompleteLexer import load_combined_dfa
+from Lexer import Lexer
+from random_specs import make_words, write_spec
+
+
+def run_lexer(dfa, word, linear):
+    lexer = Lexer()
+    lexer.load_from_combined_dfa(dfa, word)
+
+    return lexer.run(linear), lexer.rescanned_chars
+
+
+def test_linear_matches_backtracking(tmp_path):
+    # the linear mode gives the same tokens and error messages as the
+    # default one, without ever rescanning more characters
+    rng = random.Random(9)
+
+    for spec in range(60):
+        lex_file = write_spec(tmp_path / "random.spec", rng, rng.randint(1, 5))
+        dfa = load_combined_dfa(lex_file, minimize=spec % 2 == 0)
+
+        for word in make_words(rng, 20):
+            (expected, rescanned) = run_lexer(dfa, word, False)
+            (tokens, linear_rescanned) = run_lexer(dfa, word, True)
+
+            assert tokens == expected, (open(lex_file).read(), word)
+            assert linear_rescanned <= rescanned
+
+
+def test_linear_rescans_little(tmp_path):
+    # "LONG a*b; A a;" rescans the whole rest of the word for every a
+    lex_file = tmp_path / "long.spec"
+    lex_file.write_text("LONG a*b;\nA a;\n")
+
+    dfa = load_combined_dfa(str(lex_file))
+    word = "a" * 500
+
+    (expected, rescanned) = run_lexer(dfa, word, False)
+    (tokens, linear_rescanned) = run_lexer(dfa, word, True)
+
+    assert tokens == expected == [("A", "a")] * 500
+    assert rescanned > 100000
+    assert linear_rescanned < 1000
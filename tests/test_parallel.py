@@ -0,0 +1,63 @@
+import random
+
+import Lexer as lexer_module
+from CompleteLexer import load_compiled_dfa
+from Lexer import Lexer
+from random_specs import make_words, write_spec
+
+
+def assert_same_tokens(tokens, expected):
+    assert tokens.error == expected.error
+    assert list(tokens.token_ids) == list(expected.token_ids)
+    assert list(tokens.starts) == list(expected.starts)
+    assert list(tokens.ends) == list(expected.ends)
+
+
+def test_parallel_matches_sequential(tmp_path, monkeypatch):
+    # small words are lexed in parallel too, over random chunk counts, as
+    # strings and as bytes; words made of many random lines give the
+    # chunks newlines to start after, and the characters no rule matches
+    # give errors in the middle of a chunk
+    monkeypatch.setattr(lexer_module, "MIN_PARALLEL_CHARS", 0)
+    rng = random.Random(17)
+
+    for spec in range(8):
+        lex_file = write_spec(tmp_path / "random.spec", rng, rng.randint(1, 4))
+
+        with open(lex_file, "a") as fd:
+            fd.write("NEWLINE '\\n';\n")
+
+        compiled = load_compiled_dfa(lex_file, minimize=spec % 2 == 0)
+
+        for _ in range(3):
+            word = "\n".join(make_words(rng, rng.randint(1, 40), 15))
+
+            for word in (word, word.encode()):
+                lexer = Lexer()
+                lexer.load_from_compiled_dfa(compiled, word)
+
+                expected = lexer.run_tokens()
+                tokens = lexer.run_tokens_parallel(workers=2, chunk_count=rng.randint(2, 12))
+
+                assert_same_tokens(tokens, expected)
+
+
+def test_parallel_error_message(tmp_path, monkeypatch):
+    # the error message depends on everything lexed before it, it must
+    # be the one of a sequential run
+    monkeypatch.setattr(lexer_module, "MIN_PARALLEL_CHARS", 0)
+
+    lex_file = tmp_path / "words.spec"
+    lex_file.write_text("WORD [a-z]+;\nSPACE ' ' | '\\n';\n")
+
+    compiled = load_compiled_dfa(str(lex_file))
+    word = "abc def\n" * 200 + "abc 1 def\n" + "abc def\n" * 200
+
+    lexer = Lexer()
+    lexer.load_from_compiled_dfa(compiled, word)
+
+    expected = lexer.run_tokens()
+    tokens = lexer.run_tokens_parallel(workers=2, chunk_count=8)
+
+    assert expected.error is not None
+    assert_same_tokens(tokens, expected)